@@ -1,15 +1,25 @@
 
 from django.apps import apps
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 from django.contrib.auth.models import Group
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.safestring import mark_safe
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import path, reverse
+from django.shortcuts import get_object_or_404, redirect, render
 
 from .models import *
 from .forms import *
+from . import orders
+from .importer import ProductImporter, read_rows
+from .pagination import EstimatedCountPaginator
+from .pricing import get_products, reprice
+from .rollups import apply_orders, is_counted
+from .search import search
+from .thumbnails import thumbnail_url
 
 
 class CartInline(admin.StackedInline):
@@ -62,7 +72,7 @@ class ProductVariantInline(admin.TabularInline):
                     '<img src=\'{}\''
                     'style=\'width:50px; height:50px;\' />'
                 ),
-                obj.image.file.url,
+                thumbnail_url(obj.image.file, 50),
             )
         return _('NO IMAGE')
 
@@ -76,6 +86,16 @@ class AttributeValueInline(admin.TabularInline):
     show_change_link = True
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'changed_by', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class VoucherUsageInline(admin.TabularInline):
     model = VoucherUsage
     extra = 0
@@ -100,13 +120,67 @@ class ProductImageInline(admin.TabularInline):
                     '<img src=\'{}\''
                     'style=\'width:50px; height:50px;\' />'
                 ),
-                obj.file.url,
+                thumbnail_url(obj.file, 50),
             )
         return _('NO IMAGE')
 
     product_image_preview.short_description = _('FILE')
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """ Changelists that never run an exact COUNT(*) per page load. """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class NormalizedSearchAdmin:
+    """
+    Search box over the model's SEARCH_FIELDS columns: the term is folded
+    like the stored values and prefix-matched so their indexes are used.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        return (
+            search(queryset, self.model.SEARCH_FIELDS.values(), search_term),
+            False,
+        )
+
+
+def reprice_products(modeladmin, request, queryset, products):
+    """
+    Intermediate page of the reprice actions: show the form, then apply
+    it to the products with a single UPDATE.
+    """
+    if not request.user.has_perm('app.change_product'):
+        raise PermissionDenied
+
+    form = RepriceForm(request.POST if 'apply' in request.POST else None)
+    if form.is_valid():
+        count = reprice(
+            products,
+            percent = form.cleaned_data['percent'],
+            amount = form.cleaned_data['amount'],
+            rounding = form.cleaned_data['rounding'],
+            dry_run = form.cleaned_data['dry_run'],
+        )
+        if form.cleaned_data['dry_run']:
+            message = _('%(count)s PRODUCTS WOULD BE REPRICED')
+        else:
+            message = _('%(count)s PRODUCTS REPRICED')
+        modeladmin.message_user(request, message % {'count': count})
+        return None
+
+    return render(request, 'admin/app/reprice.html', {
+        **modeladmin.admin_site.each_context(request),
+        'opts': modeladmin.model._meta,
+        'title': _('REPRICE PRODUCTS'),
+        'queryset': queryset,
+        'count': products.count(),
+        'action': request.POST.get('action'),
+        'form': form,
+    })
+
+
 admin.site.unregister(Group)
 @admin.register(UserGroup)
 class CustomGroupAdmin(GroupAdmin):
@@ -121,11 +195,14 @@ class CustomGroupAdmin(GroupAdmin):
 
 
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(NormalizedSearchAdmin, UserAdmin):
         
     class Meta:
         ordering = ('date_joined')
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     inlines = [
         VendorInline,
         CartInline,
@@ -175,10 +252,11 @@ class UserAdmin(UserAdmin):
         'is_vendor',
     )
 
+    # Matched through search_username/fullname/email, see SEARCH_FIELDS.
     search_fields = (
-        'username__startswith',
-        'fullname__startswith',
-        'email__startswith',
+        'username',
+        'fullname',
+        'email',
     )
     
     def avatar_preview(self, obj):
@@ -188,7 +266,7 @@ class UserAdmin(UserAdmin):
                     '<img src=\'{}\''
                     'style=\'width:50px; height:50px; border-radius:50%;\' />'
                 ),
-                obj.avatar.url,
+                thumbnail_url(obj.avatar, 50),
             )
         return _('NO AVATAR')
     
@@ -206,7 +284,7 @@ class UserAdmin(UserAdmin):
 
 
 @admin.register(Vendor)
-class VendorAdmin(admin.ModelAdmin):
+class VendorAdmin(NormalizedSearchAdmin, admin.ModelAdmin):
 
     inlines = [ProductInline]
 
@@ -214,6 +292,7 @@ class VendorAdmin(admin.ModelAdmin):
         'store_name',
         'user_link',
         'is_approved',
+        'import_link',
     ]
 
     list_filter = (
@@ -221,9 +300,19 @@ class VendorAdmin(admin.ModelAdmin):
     )
 
     search_fields = (
-        'store_name__startswith',
+        'store_name',
     )
 
+    actions = [
+        'reprice',
+    ]
+
+    @admin.action(description=_('REPRICE PRODUCTS'))
+    def reprice(self, request, queryset):
+        return reprice_products(
+            self, request, queryset, get_products(vendors=queryset),
+        )
+
     def user_link(self, obj):
         if obj.user:
             url = reverse('admin:app_user_change', args=[obj.user.id])
@@ -232,15 +321,82 @@ class VendorAdmin(admin.ModelAdmin):
     user_link.short_description = _('USER')
     user_link.admin_order_field = 'user'
 
+    def import_link(self, obj):
+        url = reverse('admin:app_vendor_import_products', args=[obj.id])
+        return format_html('<a href=\'{}\'>{}</a>', url, _('IMPORT'))
+    import_link.short_description = _('IMPORT PRODUCTS')
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:vendor_id>/import/',
+                self.admin_site.admin_view(self.import_products_view),
+                name = 'app_vendor_import_products',
+            ),
+        ] + super().get_urls()
+
+    def import_products_view(self, request, vendor_id):
+        vendor = get_object_or_404(Vendor, pk=vendor_id)
+        if not self.has_change_permission(request, vendor):
+            raise PermissionDenied
+
+        if request.method == 'POST':
+            form = ProductImportForm(
+                request.POST,
+                request.FILES,
+                rejected_uploads = getattr(request, 'rejected_uploads', ()),
+            )
+            if form.is_valid():
+                result = ProductImporter(vendor).run(read_rows(
+                    form.cleaned_data['file'],
+                    form.cleaned_data['file_format'],
+                ))
+                for line_no, error in result.errors[:20]:
+                    self.message_user(
+                        request,
+                        f'{_("LINE")} {line_no}: {error}',
+                        messages.ERROR,
+                    )
+                self.message_user(request, str(result), messages.SUCCESS)
+                return redirect('admin:app_vendor_change', vendor.id)
+        else:
+            form = ProductImportForm()
+
+        return render(request, 'admin/app/vendor/import_products.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('IMPORT PRODUCTS'),
+            'vendor': vendor,
+            'form': form,
+        })
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = [
+        'name',
+        'parent',
+    ]
+    actions = [
+        'reprice',
+    ]
+
+    @admin.action(description=_('REPRICE PRODUCTS (WITH SUBCATEGORIES)'))
+    def reprice(self, request, queryset):
+        return reprice_products(
+            self, request, queryset, get_products(categories=queryset),
+        )
+
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     inlines = [CartItemInline]
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    inlines = [OrderItemInline]
+class OrderAdmin(LargeTableAdmin):
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    form = OrderForm
     list_display = [
         'user',
         'vendor',
@@ -248,10 +404,81 @@ class OrderAdmin(admin.ModelAdmin):
         'is_paid',
         'status',
     ]
+    list_filter = (
+        'status',
+        'is_paid',
+    )
+    actions = [
+        'mark_paid',
+        'mark_processing',
+        'mark_shipped',
+        'mark_delivered',
+        'mark_cancelled',
+    ]
+
+    def save_model(self, request, obj, form, change):
+        # Take the order out of the sales rollups with its old items; it
+        # is added back in save_related() once the inlines are saved.
+        if change and is_counted(
+            form.initial.get('is_paid'),
+            form.initial.get('status'),
+        ):
+            apply_orders([obj.pk], -1)
+
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            OrderStatusHistory.objects.create(
+                order = obj,
+                from_status = form.initial.get('status'),
+                to_status = obj.status,
+                changed_by = request.user,
+            )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if is_counted(form.instance.is_paid, form.instance.status):
+            apply_orders([form.instance.pk])
+
+    def transition_orders(self, request, queryset, to_status):
+        changed, skipped = orders.transition(
+            queryset, to_status, request.user,
+        )
+        self.message_user(
+            request,
+            _('%(changed)s ORDERS MOVED TO %(status)s, %(skipped)s SKIPPED') % {
+                'changed': changed,
+                'status': to_status,
+                'skipped': skipped,
+            },
+        )
+
+    @admin.action(description=_('MARK AS PAID'))
+    def mark_paid(self, request, queryset):
+        changed = orders.mark_paid(queryset)
+        self.message_user(
+            request,
+            _('%(changed)s ORDERS MARKED AS PAID') % {'changed': changed},
+        )
+
+    @admin.action(description=_('MARK AS PROCESSING'))
+    def mark_processing(self, request, queryset):
+        self.transition_orders(request, queryset, 'PROCESSING')
+
+    @admin.action(description=_('MARK AS SHIPPED'))
+    def mark_shipped(self, request, queryset):
+        self.transition_orders(request, queryset, 'SHIPPED')
+
+    @admin.action(description=_('MARK AS DELIVERED'))
+    def mark_delivered(self, request, queryset):
+        self.transition_orders(request, queryset, 'DELIVERED')
+
+    @admin.action(description=_('MARK AS CANCELLED'))
+    def mark_cancelled(self, request, queryset):
+        self.transition_orders(request, queryset, 'CANCELLED')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
 
     inlines = [
         ProductImageInline,
@@ -260,6 +487,8 @@ class ProductAdmin(admin.ModelAdmin):
 
     readonly_fields = [
         'default_image_preview',
+        'min_price',
+        'max_price',
     ]
 
     list_display = [
@@ -268,16 +497,19 @@ class ProductAdmin(admin.ModelAdmin):
         'vendor',
         'category',
         'price',
+        'min_price',
+        'max_price',
     ]
 
     def default_image_preview(self, obj):
-        if obj.get_default_image():
+        default_image = obj.get_default_image()
+        if default_image and default_image.file:
             return format_html(
                 (
                     '<img src=\'{}\''
                     'style=\'width:50px; height:50px;\' />'
                 ),
-                obj.get_default_image().file.url,
+                thumbnail_url(default_image.file, 50),
             )
         return _('NO DEFAULT IMAGE')
     
@@ -285,7 +517,7 @@ class ProductAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductVariant)
-class ProductVariantAdmin(admin.ModelAdmin):
+class ProductVariantAdmin(LargeTableAdmin):
     list_display = [
         'product',
         'product_image_preview',
@@ -300,7 +532,7 @@ class ProductVariantAdmin(admin.ModelAdmin):
                     '<img src=\'{}\''
                     'style=\'width:50px; height:50px;\' />'
                 ),
-                obj.image.file.url,
+                thumbnail_url(obj.image.file, 50),
             )
         return _('NO IMAGE')
     
@@ -323,11 +555,70 @@ class AttributeValueAdmin(admin.ModelAdmin):
     ]
 
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(LargeTableAdmin):
+    list_display = [
+        'subject',
+        'to',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'sent_at',
+    ]
+    list_filter = (
+        'status',
+    )
+    readonly_fields = [
+        'attempts',
+        'last_error',
+        'sent_at',
+    ]
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = [
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'run_at',
+        'finished_at',
+    ]
+    list_filter = (
+        'status',
+        'name',
+    )
+    readonly_fields = [
+        'attempts',
+        'locked_by',
+        'locked_until',
+        'last_error',
+        'finished_at',
+    ]
+    actions = [
+        'requeue',
+    ]
+
+    @admin.action(description=_('REQUEUE'))
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status='RUNNING').update(
+            status = 'QUEUED',
+            attempts = 0,
+            run_at = timezone.now(),
+            finished_at = None,
+        )
+        self.message_user(
+            request,
+            _('%(count)s JOBS REQUEUED') % {'count': count},
+        )
+
+
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     inlines = [VoucherUsageInline]
 
 
 for model in apps.get_app_config('app').get_models():
-    try: admin.site.register(model)
+    try: admin.site.register(model, LargeTableAdmin)
     except: pass
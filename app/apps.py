@@ -8,3 +8,9 @@ class AppConfig(AppConfig):
 
     def ready(self):
         import app.signals
+        import app.tasks
+
+        from django.conf import settings
+        if getattr(settings, 'TEMPLATE_PRECOMPILE', None):
+            from app.fragments import precompile_templates
+            precompile_templates()
@@ -0,0 +1,372 @@
+
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import *
+
+
+def get_max_quantity():
+    """ The largest quantity a single cart line may hold. """
+    return getattr(settings, 'CART_MAX_QUANTITY', 999)
+
+
+def merge_items(items):
+    """ Sum quantities of (product_id, variant_id, quantity) per line. """
+    merged = defaultdict(int)
+    for product_id, variant_id, quantity in items:
+        merged[(product_id, variant_id or None)] += quantity
+    return merged
+
+
+def validate_items(cart, keys):
+    """ Check every product belongs to the cart's vendor and every variant
+    to its product, with one query each. """
+    product_ids = {product_id for product_id, _variant_id in keys}
+    variant_ids = {variant_id for _product_id, variant_id in keys if variant_id}
+
+    valid_products = set(
+        Product.objects.filter(
+            pk__in = product_ids,
+            vendor_id = cart.vendor_id,
+        ).values_list('pk', flat=True)
+    )
+    if valid_products != product_ids:
+        raise ValidationError(_(
+            'THE PRODUCT\'S VENDOR DOES NOT MATCH THE CART\'S VENDOR'
+        ))
+
+    if variant_ids:
+        variant_products = dict(
+            ProductVariant.objects.filter(
+                pk__in = variant_ids,
+            ).values_list('pk', 'product_id')
+        )
+        for product_id, variant_id in keys:
+            if variant_id and variant_products.get(variant_id) != product_id:
+                raise ValidationError(_(
+                    'THE VARIANT DOES NOT BELONG TO THE PRODUCT'
+                ))
+
+
+def get_lines(cart, keys):
+    """ Existing cart items for the given (product_id, variant_id) keys. """
+    product_ids = {product_id for product_id, _variant_id in keys}
+    lines = {}
+    for item in CartItem.objects.select_for_update().filter(
+        cart = cart,
+        product_id__in = product_ids,
+    ):
+        lines.setdefault((item.product_id, item.product_variant_id), item)
+    return lines
+
+
+def add_lines(lines):
+    """
+    Add {(cart_id, product_id, variant_id): quantity} to one or many carts
+    with one read, one bulk_update and one bulk_create.
+    """
+    cart_ids = {cart_id for cart_id, _product_id, _variant_id in lines}
+    product_ids = {product_id for _cart_id, product_id, _variant_id in lines}
+
+    existing = {}
+    for item in CartItem.objects.select_for_update().filter(
+        cart_id__in = cart_ids,
+        product_id__in = product_ids,
+    ):
+        existing.setdefault(
+            (item.cart_id, item.product_id, item.product_variant_id), item,
+        )
+
+    to_update = []
+    to_create = []
+    for (cart_id, product_id, variant_id), quantity in lines.items():
+        item = existing.get((cart_id, product_id, variant_id))
+        if item:
+            item.quantity += quantity
+            to_update.append(item)
+        else:
+            to_create.append(CartItem(
+                cart_id = cart_id,
+                product_id = product_id,
+                product_variant_id = variant_id,
+                quantity = quantity,
+            ))
+
+    CartItem.objects.bulk_update(to_update, ['quantity'])
+    CartItem.objects.bulk_create(to_create)
+    Cart.objects.filter(pk__in=cart_ids).update(updated_at=timezone.now())
+
+
+@transaction.atomic
+def add_items(cart, items):
+    """
+    Add (product_id, variant_id, quantity) lines to the cart, merging with
+    existing lines for the same product and variant.
+    """
+    merged = merge_items(items)
+    if not merged:
+        return
+    validate_items(cart, merged.keys())
+
+    add_lines({
+        (cart.pk, product_id, variant_id): quantity
+        for (product_id, variant_id), quantity in merged.items()
+    })
+
+
+@transaction.atomic
+def update_items(cart, items):
+    """
+    Set the quantity of (product_id, variant_id, quantity) lines; a
+    quantity of 0 removes the line.
+    """
+    quantities = {
+        (product_id, variant_id or None): quantity
+        for product_id, variant_id, quantity in items
+    }
+    if not quantities:
+        return
+    validate_items(cart, quantities.keys())
+
+    lines = get_lines(cart, quantities.keys())
+
+    to_update = []
+    to_create = []
+    to_delete = []
+    for key, quantity in quantities.items():
+        item = lines.get(key)
+        if item and quantity <= 0:
+            to_delete.append(item.pk)
+        elif item:
+            item.quantity = quantity
+            to_update.append(item)
+        elif quantity > 0:
+            to_create.append(CartItem(
+                cart = cart,
+                product_id = key[0],
+                product_variant_id = key[1],
+                quantity = quantity,
+            ))
+
+    CartItem.objects.filter(pk__in=to_delete).delete()
+    CartItem.objects.bulk_update(to_update, ['quantity'])
+    CartItem.objects.bulk_create(to_create)
+    Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+def with_prices(queryset):
+    """ Annotate cart items with unit_price and line_total in SQL. """
+    return queryset.annotate(
+        unit_price = F('product__price') + Coalesce(
+            F('product_variant__price_modifier'),
+            Value(Decimal('0.00')),
+            output_field = models.DecimalField(
+                max_digits = 10,
+                decimal_places = 2,
+            ),
+        ),
+        line_total = F('unit_price') * F('quantity'),
+    )
+
+
+def get_summary(cart):
+    """ Line totals and the grand total of a cart in one query. """
+    lines = list(
+        with_prices(
+            CartItem.objects.filter(cart=cart),
+        ).annotate(
+            cart_total = Window(Sum('line_total')),
+        ).order_by(
+            'pk',
+        ).values(
+            'pk',
+            'product_id',
+            'product_variant_id',
+            'quantity',
+            'unit_price',
+            'line_total',
+            'cart_total',
+        )
+    )
+
+    total = lines[0].pop('cart_total') if lines else Decimal('0.00')
+    for line in lines[1:]:
+        line.pop('cart_total')
+
+    return {
+        'items': lines,
+        'total': total,
+    }
+
+
+@transaction.atomic
+def merge_into_user_carts(user, items):
+    """
+    Write (product_id, variant_id, quantity) lines into the user's
+    per-vendor carts, creating missing carts in one batch. Lines for
+    unknown or inactive products and mismatched variants are dropped and
+    quantities are capped at get_max_quantity().
+    """
+    max_quantity = get_max_quantity()
+    merged = {
+        key: min(quantity, max_quantity)
+        for key, quantity in merge_items(items).items()
+        if quantity > 0
+    }
+    if not merged:
+        return []
+
+    product_ids = {product_id for product_id, _variant_id in merged}
+    variant_ids = {variant_id for _product_id, variant_id in merged if variant_id}
+
+    product_vendors = dict(
+        Product.objects.filter(
+            pk__in = product_ids,
+            is_active = True,
+        ).values_list('pk', 'vendor_id')
+    )
+    variant_products = dict(
+        ProductVariant.objects.filter(
+            pk__in = variant_ids,
+        ).values_list('pk', 'product_id')
+    )
+    merged = {
+        (product_id, variant_id): quantity
+        for (product_id, variant_id), quantity in merged.items()
+        if product_id in product_vendors
+        and (variant_id is None or variant_products.get(variant_id) == product_id)
+    }
+    if not merged:
+        return []
+
+    vendor_ids = {product_vendors[product_id] for product_id, _ in merged}
+    carts = {}
+    for cart in Cart.objects.filter(user=user, vendor_id__in=vendor_ids):
+        carts.setdefault(cart.vendor_id, cart)
+    Cart.objects.bulk_create([
+        carts.setdefault(vendor_id, Cart(user=user, vendor_id=vendor_id))
+        for vendor_id in vendor_ids
+        if vendor_id not in carts
+    ])
+
+    add_lines({
+        (carts[product_vendors[product_id]].pk, product_id, variant_id): quantity
+        for (product_id, variant_id), quantity in merged.items()
+    })
+    return list(carts.values())
+
+
+class SessionCart:
+    """
+    Cart lines kept in the session (CART_STORAGE = 'session') or in the
+    cache ('cache') and only written to Cart/CartItem by flush(), which
+    runs at login and checkout.
+    """
+
+    SESSION_KEY = 'cart'
+    TOKEN_KEY = 'cart_token'
+
+    def __init__(self, request):
+        self.request = request
+        self.storage = getattr(settings, 'CART_STORAGE', 'session')
+        self.lines = self.load()
+
+    def __iter__(self):
+        for key, quantity in self.lines.items():
+            product_id, variant_id = key.split(':')
+            yield int(product_id), int(variant_id) or None, quantity
+
+    def __len__(self):
+        return len(self.lines)
+
+    def get_cache_key(self):
+        # The token survives session.cycle_key() on login.
+        token = self.request.session.get(self.TOKEN_KEY)
+        if not token:
+            token = self.request.session[self.TOKEN_KEY] = uuid.uuid4().hex
+        return f'cart:{token}'
+
+    def load(self):
+        if self.storage == 'cache':
+            return cache.get(self.get_cache_key(), {})
+        return self.request.session.get(self.SESSION_KEY, {})
+
+    def save(self):
+        if self.storage == 'cache':
+            cache.set(
+                self.get_cache_key(),
+                self.lines,
+                getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 7),
+            )
+        else:
+            self.request.session[self.SESSION_KEY] = self.lines
+
+    def check(self, product_id, variant_id, quantity):
+        """
+        The line key for an active product and, if given, one of its
+        variants. Raises ValueError for anything else or a quantity over
+        get_max_quantity().
+        """
+        product_id = int(product_id)
+        variant_id = int(variant_id or 0)
+        if quantity > get_max_quantity():
+            raise ValueError('Quantity is too large.')
+        if variant_id:
+            found = ProductVariant.objects.filter(
+                pk = variant_id,
+                product_id = product_id,
+                product__is_active = True,
+            ).exists()
+        else:
+            found = Product.objects.filter(
+                pk = product_id,
+                is_active = True,
+            ).exists()
+        if not found:
+            raise ValueError('Unknown product.')
+        return f'{product_id}:{variant_id}'
+
+    def add(self, product_id, variant_id=None, quantity=1):
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError('Quantity must be positive.')
+        key = f'{int(product_id)}:{int(variant_id or 0)}'
+        quantity += self.lines.get(key, 0)
+        self.lines[self.check(product_id, variant_id, quantity)] = quantity
+        self.save()
+
+    def update(self, product_id, variant_id=None, quantity=1):
+        """ Set the quantity of a line; a quantity of 0 removes it. """
+        quantity = int(quantity)
+        if quantity < 0:
+            raise ValueError('Quantity must not be negative.')
+        if quantity:
+            self.lines[self.check(product_id, variant_id, quantity)] = quantity
+        else:
+            self.lines.pop(f'{int(product_id)}:{int(variant_id or 0)}', None)
+        self.save()
+
+    def clear(self):
+        self.lines = {}
+        if self.storage == 'cache':
+            cache.delete(self.get_cache_key())
+        else:
+            self.request.session.pop(self.SESSION_KEY, None)
+
+    def flush(self, user):
+        """ Merge the lines into the user's carts and empty the store. """
+        if not self.lines:
+            return []
+        carts = merge_into_user_carts(user, self)
+        self.clear()
+        return carts
@@ -0,0 +1,138 @@
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+
+from .cart import with_prices
+from .models import *
+from .reservations import decrement_stock, reserve_cart, take
+
+
+def get_cart_lines(cart_ids):
+    """ Cart items of the given carts with their current unit prices. """
+    return list(
+        with_prices(
+            CartItem.objects.filter(cart_id__in=cart_ids),
+        ).order_by(
+            'cart_id', 'pk',
+        ).values(
+            'cart_id',
+            'product_id',
+            'product_variant_id',
+            'quantity',
+            'unit_price',
+        )
+    )
+
+
+def build_order_items(order, lines):
+    return [
+        OrderItem(
+            order = order,
+            product_id = line['product_id'],
+            product_variant_id = line['product_variant_id'],
+            quantity = line['quantity'],
+            price = line['unit_price'],
+        )
+        for line in lines
+    ]
+
+
+@transaction.atomic
+def place_orders(carts, payment_method=None):
+    """
+    Turn carts into one order per cart: take stock (or consume the carts'
+    reservations), snapshot prices into
+    OrderItems and empty the carts, all or nothing, with batched inserts
+    regardless of the number of carts. Raises OutOfStock when any product
+    cannot cover its quantity.
+    """
+    carts = list(
+        Cart.objects.select_for_update().filter(
+            pk__in = [cart.pk for cart in carts],
+        ).order_by('pk')
+    )
+
+    lines = get_cart_lines([cart.pk for cart in carts])
+    if not lines:
+        raise ValidationError(_('THE CART IS EMPTY'), code='empty_cart')
+
+    # Stock already held for these carts counts towards their lines.
+    held = take(StockReservation.objects.filter(
+        cart_id__in = [cart.pk for cart in carts],
+    ))
+    decrement_stock(lines, held)
+
+    lines_by_cart = defaultdict(list)
+    for line in lines:
+        lines_by_cart[line['cart_id']].append(line)
+
+    orders = {
+        cart.pk: Order(
+            user_id = cart.user_id,
+            vendor_id = cart.vendor_id,
+            total_price = sum(
+                (
+                    line['unit_price'] * line['quantity']
+                    for line in lines_by_cart[cart.pk]
+                ),
+                Decimal('0.00'),
+            ),
+        )
+        for cart in carts
+        if lines_by_cart[cart.pk]
+    }
+    Order.objects.bulk_create(orders.values())
+
+    OrderItem.objects.bulk_create([
+        order_item
+        for cart_id, order in orders.items()
+        for order_item in build_order_items(order, lines_by_cart[cart_id])
+    ])
+
+    if payment_method is not None:
+        Payment.objects.bulk_create([
+            Payment(
+                order = order,
+                payment_method = payment_method,
+                amount = order.total_price,
+            )
+            for order in orders.values()
+        ])
+
+    CartItem.objects.filter(cart_id__in=orders.keys()).delete()
+
+    return list(orders.values())
+
+
+def checkout(cart, payment_method=None):
+    """ Checkout a single cart; see place_orders(). """
+    return place_orders([cart], payment_method)[0]
+
+
+def checkout_all(user, payment_method=None):
+    """ Checkout every cart of the user into per-vendor orders at once. """
+    return place_orders(
+        Cart.objects.filter(user=user, cartitem__isnull=False).distinct(),
+        payment_method,
+    )
+
+
+@transaction.atomic
+def reserve_all(user, ttl=None):
+    """
+    Hold stock for every cart of the user while they pay; place_orders()
+    consumes the holds. Raises OutOfStock without holding anything.
+    """
+    reservations = []
+    for cart in Cart.objects.filter(
+        user = user,
+        cartitem__isnull = False,
+    ).distinct().order_by('pk'):
+        reservations += reserve_cart(cart, ttl)
+    if not reservations:
+        raise ValidationError(_('THE CART IS EMPTY'), code='empty_cart')
+    return reservations
@@ -0,0 +1,134 @@
+
+import gzip, re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ACCEPTS = re.compile(r'\b(br|gzip)\b')
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html',
+    '.xml',
+)
+
+
+def get_encodings(request):
+    """ Encodings the client accepts, best first. """
+    accepted = set(
+        ACCEPTS.findall(request.headers.get('Accept-Encoding', '')),
+    )
+    return [
+        encoding for encoding in ('br', 'gzip')
+        if encoding in accepted and (encoding != 'br' or brotli)
+    ]
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type.startswith(
+        tuple(getattr(settings, 'COMPRESS_CONTENT_TYPES', COMPRESSIBLE_TYPES))
+    )
+
+
+def compress_brotli(content):
+    return brotli.compress(
+        content,
+        quality = getattr(settings, 'BROTLI_QUALITY', 5),
+    )
+
+
+def compress_brotli_sequence(sequence):
+    compressor = brotli.Compressor(
+        quality = getattr(settings, 'BROTLI_QUALITY', 5),
+    )
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+        # Flush so each chunk reaches the client as it is produced.
+        data = compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressedStaticFilesStorage(StaticFilesStorage):
+    """
+    collectstatic writes .gz (and .br with brotli installed) siblings of
+    text assets, which app.media.serve_static picks per request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        min_size = getattr(settings, 'COMPRESS_MIN_SIZE', 200)
+        for name in paths:
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(name) as file:
+                content = file.read()
+            if len(content) < min_size:
+                continue
+
+            variants = [
+                ('.gz', gzip.compress(content, compresslevel=9, mtime=0)),
+            ]
+            if brotli:
+                variants.append(('.br', brotli.compress(content, quality=11)))
+
+            for suffix, compressed in variants:
+                # Only keep variants that actually save bytes.
+                if len(compressed) >= len(content):
+                    continue
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+            yield name, name, True
+
+
+def compress_brotli_response(response):
+    """ Brotli-encode the response body in place when it gets smaller. """
+    if response.has_header('Content-Encoding'):
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    if response.streaming:
+        if response.is_async:
+            return response
+        response.streaming_content = compress_brotli_sequence(
+            response.streaming_content,
+        )
+        # The length of the compressed stream is not known in advance.
+        response.headers.pop('Content-Length', None)
+    else:
+        compressed = compress_brotli(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    # The compressed body differs byte for byte from the original.
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+    response['Content-Encoding'] = 'br'
+    return response
@@ -0,0 +1,99 @@
+
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+
+def get_validators(queryset, *extra):
+    """
+    (etag, last_modified) of a queryset from one aggregate query over
+    updated_at, or of a list of already loaded objects without a query.
+    The row count is part of the ETag so deletions show up.
+    """
+    if isinstance(queryset, (list, tuple)):
+        stats = {
+            'count': len(queryset),
+            'latest': max(
+                (obj.updated_at for obj in queryset),
+                default = None,
+            ),
+        }
+    else:
+        stats = queryset.order_by().aggregate(
+            count = Count('pk'),
+            latest = Max('updated_at'),
+        )
+    latest = stats['latest']
+    etag = hashlib.md5(
+        '|'.join(
+            str(value) for value in (
+                stats['count'],
+                latest.isoformat() if latest else '',
+                *extra,
+            )
+        ).encode()
+    ).hexdigest()
+    return f'"{etag}"', latest.timestamp() if latest else None
+
+
+def condition_on_updated_at(get_queryset):
+    """
+    Answer GET/HEAD with 304 Not Modified from the latest updated_at of
+    get_queryset(request, *args, **kwargs) (a queryset or a list of
+    loaded objects), before the view body runs.
+    The ETag varies on the user, session and language, so a new login
+    never revalidates a page holding the previous session's CSRF token;
+    only the ETag can produce a 304. Requests with pending messages
+    always get a full response.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            etag, last_modified = get_validators(
+                get_queryset(request, *args, **kwargs),
+                request.user.pk,
+                getattr(request, 'session', None)
+                and request.session.session_key,
+                get_language(),
+            )
+
+            headers = {
+                'ETag': etag,
+                # Validators depend on the session user.
+                'Cache-Control': 'private, no-cache',
+                'Vary': 'Cookie',
+            }
+            if last_modified:
+                headers['Last-Modified'] = http_date(last_modified)
+
+            if not len(get_messages(request)):
+                validators = HttpResponse(headers=headers)
+                # Last-Modified is informational: If-Modified-Since alone
+                # cannot tell sessions apart.
+                response = get_conditional_response(
+                    request,
+                    etag = etag,
+                    response = validators,
+                )
+                if response is not validators:
+                    return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                for header, value in headers.items():
+                    if header == 'Vary':
+                        patch_vary_headers(response, [value])
+                    else:
+                        response.headers.setdefault(header, value)
+            return response
+        return _wrapped_view
+    return decorator
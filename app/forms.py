@@ -2,12 +2,19 @@
 import logging
 
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UsernameField, ReadOnlyPasswordHashField
 from django.contrib.auth import get_user_model, authenticate
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.text import capfirst
 from django.utils.translation import gettext_lazy as _
 
+from .models import Order
+from .pricing import ROUNDING
+from .tasks import process_avatar
+from .uploads import stage_upload
+
 
 logger = logging.getLogger('app')
 
@@ -154,6 +161,38 @@ class ProfileForm(forms.ModelForm):
             ),
         }
 
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        self.rejected_uploads = rejected_uploads
+        super().__init__(*args, **kwargs)
+
+    def clean_avatar(self):
+        avatar = self.cleaned_data.get('avatar')
+        image = getattr(avatar, 'image', None)
+        max_pixels = getattr(settings, 'AVATAR_MAX_PIXELS', 25_000_000)
+        if image and image.width * image.height > max_pixels:
+            raise ValidationError(_('IMAGE DIMENSIONS ARE TOO LARGE'))
+        return avatar
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in self.rejected_uploads:
+            if field in self.fields:
+                self.add_error(field, _('FILE IS TOO LARGE'))
+        return cleaned_data
+
+    def save(self, commit=True):
+        """ Keep the current avatar and process the new one off-request. """
+        avatar = self.cleaned_data.get('avatar')
+        if not isinstance(avatar, UploadedFile):
+            return super().save(commit)
+
+        self.instance.avatar = self.initial.get('avatar')
+        user = super().save(commit)
+
+        name = stage_upload(avatar, 'avatar')
+        process_avatar.delay(user.pk, name)
+        return user
+
 
 class SetNewPasswordForm(forms.Form):
 
@@ -177,4 +216,89 @@ class SetNewPasswordForm(forms.Form):
             raise forms.ValidationError('Passwords do not match.')
         
         return cleaned_data
-    
+
+
+class OrderForm(forms.ModelForm):
+
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data.get('status')
+        current = self.initial.get('status')
+
+        if (
+            self.instance.pk
+            and status != current
+            and status not in Order.TRANSITIONS.get(current, ())
+        ):
+            raise ValidationError(
+                _('CANNOT CHANGE STATUS FROM %(from)s TO %(to)s'),
+                code = 'invalid_transition',
+                params = {'from': current, 'to': status},
+            )
+        return status
+
+
+class ProductImportForm(forms.Form):
+
+    file = forms.FileField(
+        label = _('FILE'),
+    )
+
+    file_format = forms.ChoiceField(
+        label = _('FORMAT'),
+        choices = [
+            ('csv', 'CSV'),
+            ('jsonl', 'JSONL'),
+        ],
+    )
+
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        self.rejected_uploads = rejected_uploads
+        super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'file' in self.rejected_uploads:
+            self.add_error('file', _('FILE IS TOO LARGE'))
+        return cleaned_data
+
+
+class RepriceForm(forms.Form):
+
+    percent = forms.DecimalField(
+        label = _('PERCENT CHANGE'),
+        max_digits = 6,
+        decimal_places = 2,
+        min_value = -100,
+        required = False,
+    )
+
+    amount = forms.DecimalField(
+        label = _('AMOUNT CHANGE'),
+        max_digits = 10,
+        decimal_places = 2,
+        required = False,
+    )
+
+    rounding = forms.ChoiceField(
+        label = _('ROUNDING'),
+        choices = list(ROUNDING.items()),
+        initial = 'cents',
+    )
+
+    dry_run = forms.BooleanField(
+        label = _('DRY RUN'),
+        required = False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (
+            cleaned_data.get('percent') is None
+            and cleaned_data.get('amount') is None
+        ):
+            raise ValidationError(_('GIVE A PERCENT OR AN AMOUNT CHANGE'))
+        return cleaned_data
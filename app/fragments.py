@@ -0,0 +1,61 @@
+
+import fnmatch, logging, os, time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import engines
+from django.utils import translation
+
+
+logger = logging.getLogger('app')
+
+
+def fragment_key(fragment_name, vary_on=(), language=None):
+    """ Cache key of a {% langcache %} fragment for one language. """
+    return make_template_fragment_key(
+        fragment_name,
+        [language or translation.get_language(), *vary_on],
+    )
+
+
+def invalidate_fragment(fragment_name, vary_on=(), cache_name='default'):
+    """ Drop a {% langcache %} fragment in every language. """
+    caches[cache_name].delete_many([
+        fragment_key(fragment_name, vary_on, language)
+        for language, _name in settings.LANGUAGES
+    ])
+
+
+def find_templates(patterns):
+    """ Template names under the project DIRS matching the glob patterns. """
+    names = set()
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for root, _dirs, files in os.walk(directory):
+            for file in files:
+                name = os.path.relpath(
+                    os.path.join(root, file), directory,
+                ).replace(os.sep, '/')
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    names.add(name)
+    return sorted(names)
+
+
+def precompile_templates():
+    """
+    Load TEMPLATE_PRECOMPILE templates once so the cached loader holds
+    their compiled form before the first request.
+    """
+    started = time.perf_counter()
+    names = find_templates(getattr(settings, 'TEMPLATE_PRECOMPILE', []))
+    engine = engines['django']
+    for name in names:
+        try:
+            engine.get_template(name)
+        except Exception as ex:
+            logger.error(f'Could not precompile {name}: {ex}')
+    logger.info(
+        f'Precompiled {len(names)} templates in '
+        f'{(time.perf_counter() - started) * 1000:.0f}ms'
+    )
+    return names
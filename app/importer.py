@@ -0,0 +1,370 @@
+
+import csv, io, json, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import *
+from .pagecache import purge
+
+
+PRODUCT_FIELDS = [
+    'category', 'name', 'description', 'price', 'stock', 'is_active',
+    'updated_at',
+]
+
+# Largest value a PositiveIntegerField holds on every backend.
+MAX_STOCK = 2147483647
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        return (
+            f'{self.rows} rows in {self.elapsed:.1f}s '
+            f'({self.rows_per_second:.0f} rows/s): '
+            f'{self.created} created, {self.updated} updated, '
+            f'{len(self.errors)} errors'
+        )
+
+
+def read_rows(file, file_format):
+    """ Yield (line number, dict) from a CSV or JSONL byte/text stream. """
+    if isinstance(file.read(0), bytes):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+    if file_format == 'jsonl':
+        for line_no, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError as ex:
+                    yield line_no, ex
+        return
+
+    for line_no, row in enumerate(csv.DictReader(file), 2):
+        yield line_no, row
+
+
+def parse_decimal(value, field, label):
+    """
+    A finite Decimal rounded to the DecimalField's decimal_places that
+    fits its max_digits, or ValueError.
+    """
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'Invalid {label}: {value}')
+    if not number.is_finite():
+        raise ValueError(f'Invalid {label}: {value}')
+
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if abs(number) < limit:
+        number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+    # Checked again after rounding: 99999999.995 rounds up to 10^8.
+    if abs(number) >= limit:
+        raise ValueError(f'{label} is too large: {value}')
+    return number
+
+
+def parse_variants(value):
+    """
+    Variants as 'Color=Red:2.50;Size=L' or a list of
+    {'attribute', 'value', 'price_modifier'}.
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [
+            (
+                str(item['attribute']).strip(),
+                str(item['value']).strip(),
+                parse_decimal(
+                    item.get('price_modifier') or 0,
+                    ProductVariant._meta.get_field('price_modifier'),
+                    'price modifier',
+                ),
+            )
+            for item in value
+        ]
+
+    variants = []
+    for part in str(value).split(';'):
+        if not part.strip():
+            continue
+        attribute, _, rest = part.partition('=')
+        value, _, modifier = rest.partition(':')
+        if not attribute.strip() or not value.strip():
+            raise ValueError(f'Invalid variant: {part}')
+        variants.append((
+            attribute.strip(),
+            value.strip(),
+            parse_decimal(
+                modifier or 0,
+                ProductVariant._meta.get_field('price_modifier'),
+                'price modifier',
+            ),
+        ))
+    return variants
+
+
+class ProductImporter:
+    """
+    Upsert a vendor's products by SKU in batches. Categories and
+    attribute values are resolved through maps loaded once per import;
+    missing attributes and values are created. Variants listed for a
+    product are upserted, others are left untouched.
+    """
+
+    def __init__(self, vendor, batch_size=1000):
+        self.vendor = vendor
+        self.batch_size = batch_size
+        self.result = ImportResult()
+        self.surrogate_keys = set()
+        self.categories = self.load_categories()
+        self.attributes = {
+            name.lower(): pk
+            for pk, name in Attribute.objects.values_list('pk', 'name')
+        }
+        self.attribute_values = {
+            (attribute_id, value.lower()): pk
+            for pk, attribute_id, value in AttributeValue.objects.values_list(
+                'pk', 'attribute_id', 'value',
+            )
+        }
+
+    def load_categories(self):
+        """ Map lowercased names and 'Parent/Child' paths to ids. """
+        rows = {
+            pk: (name, parent_id)
+            for pk, name, parent_id in Category.objects.values_list(
+                'pk', 'name', 'parent_id',
+            )
+        }
+
+        def get_path(pk):
+            names = []
+            while pk and len(names) <= len(rows):
+                name, pk = rows[pk]
+                names.append(name)
+            return '/'.join(reversed(names)).lower()
+
+        paths = {}
+        names = {}
+        for pk, (name, _parent_id) in rows.items():
+            paths[get_path(pk)] = pk
+            # Bare names only resolve when they are unambiguous.
+            key = name.lower()
+            names[key] = None if key in names else pk
+        return {**names, **paths}
+
+    def run(self, rows):
+        batch = []
+        for line_no, row in rows:
+            batch.append((line_no, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        # bulk_create() sends no signals; purge the cached pages of the
+        # vendor and of every imported product and its category.
+        purge(f'vendor:{self.vendor.pk}', *self.surrogate_keys)
+        return self.result
+
+    def parse(self, row):
+        if isinstance(row, Exception):
+            raise ValueError(f'Invalid row: {row}')
+        if not isinstance(row, dict):
+            raise ValueError('Invalid row: expected an object')
+
+        sku = str(row.get('sku') or '').strip()
+        name = str(row.get('name') or '').strip()
+        if not sku or not name:
+            raise ValueError('sku and name are required')
+        if len(sku) > 64:
+            raise ValueError('sku is longer than 64 characters')
+
+        price = parse_decimal(
+            row.get('price'), Product._meta.get_field('price'), 'price',
+        )
+        if price < 0:
+            raise ValueError('price cannot be negative')
+
+        try:
+            stock = int(row.get('stock') or 0)
+        except (OverflowError, TypeError, ValueError):
+            raise ValueError(f'Invalid stock: {row.get("stock")}')
+        if stock < 0:
+            raise ValueError('stock cannot be negative')
+        if stock > MAX_STOCK:
+            raise ValueError(f'stock is too large: {stock}')
+
+        category_id = None
+        category = str(row.get('category') or '').strip().lower()
+        if category:
+            category_id = self.categories.get(category)
+            if category_id is None:
+                raise ValueError(f'Unknown category: {row.get("category")}')
+
+        is_active = row.get('is_active', True)
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower() not in ('0', 'false', 'no')
+
+        product = Product(
+            vendor = self.vendor,
+            sku = sku,
+            name = name[:255],
+            description = row.get('description') or None,
+            price = price,
+            stock = stock,
+            category_id = category_id,
+            is_active = bool(is_active),
+        )
+        variants = None
+        if 'variants' in row:
+            variants = parse_variants(row['variants'])
+        return product, variants
+
+    def resolve_attribute_values(self, variants):
+        """ Resolve (attribute, value) pairs, creating missing ones. """
+        missing = {
+            attribute for attribute, _value, _modifier in variants
+            if attribute.lower() not in self.attributes
+        }
+        if missing:
+            Attribute.objects.bulk_create(
+                [Attribute(name=name) for name in missing],
+                ignore_conflicts = True,
+            )
+            self.attributes.update({
+                name.lower(): pk
+                for pk, name in Attribute.objects.filter(
+                    name__in = missing,
+                ).values_list('pk', 'name')
+            })
+
+        missing = {}
+        for attribute, value, _modifier in variants:
+            key = (self.attributes[attribute.lower()], value.lower())
+            if key not in self.attribute_values:
+                missing.setdefault(key, AttributeValue(
+                    attribute_id = key[0],
+                    value = value,
+                ))
+        for attribute_value in AttributeValue.objects.bulk_create(
+            missing.values(),
+        ):
+            self.attribute_values[(
+                attribute_value.attribute_id, attribute_value.value.lower(),
+            )] = attribute_value.pk
+
+    def import_batch(self, batch):
+        products = {}
+        variants = {}
+        for line_no, row in batch:
+            self.result.rows += 1
+            try:
+                product, product_variants = self.parse(row)
+            except (ValueError, TypeError, KeyError, InvalidOperation) as ex:
+                self.result.errors.append((line_no, str(ex)))
+                continue
+            products[product.sku] = product
+            if product_variants is not None:
+                variants[product.sku] = product_variants
+
+        if not products:
+            return
+
+        with transaction.atomic():
+            existing = set(
+                Product.objects.filter(
+                    vendor = self.vendor,
+                    sku__in = products.keys(),
+                ).values_list('sku', flat=True)
+            )
+
+            Product.objects.bulk_create(
+                products.values(),
+                update_conflicts = True,
+                unique_fields = ['vendor', 'sku'],
+                update_fields = PRODUCT_FIELDS,
+            )
+
+            product_ids = dict(
+                Product.objects.filter(
+                    vendor = self.vendor,
+                    sku__in = products.keys(),
+                ).values_list('sku', 'pk')
+            )
+
+            if variants:
+                self.import_variants(variants, product_ids)
+
+            Product.objects.filter(
+                pk__in = product_ids.values(),
+            ).refresh_price_range()
+
+        self.surrogate_keys.update(
+            f'product:{pk}' for pk in product_ids.values()
+        )
+        self.surrogate_keys.update(
+            f'category:{product.category_id}'
+            for product in products.values()
+            if product.category_id
+        )
+        self.result.updated += len(existing)
+        self.result.created += len(products) - len(existing)
+
+    def import_variants(self, variants, product_ids):
+        self.resolve_attribute_values([
+            variant for items in variants.values() for variant in items
+        ])
+
+        wanted = {}
+        for sku, items in variants.items():
+            for attribute, value, modifier in items:
+                attribute_value_id = self.attribute_values[(
+                    self.attributes[attribute.lower()], value.lower(),
+                )]
+                wanted[(product_ids[sku], attribute_value_id)] = modifier
+
+        existing = {}
+        for variant in ProductVariant.objects.filter(
+            product_id__in = {product_id for product_id, _ in wanted},
+        ):
+            existing.setdefault(
+                (variant.product_id, variant.attribute_value_id), variant,
+            )
+
+        to_update = []
+        to_create = []
+        for (product_id, attribute_value_id), modifier in wanted.items():
+            variant = existing.get((product_id, attribute_value_id))
+            if variant is None:
+                to_create.append(ProductVariant(
+                    product_id = product_id,
+                    attribute_value_id = attribute_value_id,
+                    price_modifier = modifier,
+                ))
+            elif variant.price_modifier != modifier:
+                variant.price_modifier = modifier
+                to_update.append(variant)
+
+        ProductVariant.objects.bulk_update(to_update, ['price_modifier'])
+        ProductVariant.objects.bulk_create(to_create)
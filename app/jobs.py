@@ -0,0 +1,283 @@
+
+import logging, os, socket, threading, time, traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import *
+
+
+logger = logging.getLogger('app')
+
+registry = {}
+
+
+def job(name=None, max_attempts=5, priority=0):
+    """
+    Register a function as a job type. The function gains
+    .delay(*args, **kwargs), which queues it once the current transaction
+    commits; arguments must be JSON serialisable.
+    """
+    def decorator(func):
+        job_name = name or func.__name__
+        registry[job_name] = func
+
+        def delay(*args, **kwargs):
+            return enqueue_job(
+                job_name,
+                args,
+                kwargs,
+                priority = priority,
+                max_attempts = max_attempts,
+            )
+
+        func.job_name = job_name
+        func.delay = delay
+        return func
+    return decorator
+
+
+def enqueue_job(
+    name, args=(), kwargs=None, priority=0, run_at=None, max_attempts=5,
+    unique=False,
+):
+    """
+    Queue a job after the current transaction commits. With unique, the
+    job is dropped if the same name and arguments are already queued.
+    """
+    def create():
+        if unique and Job.objects.filter(
+            name = name,
+            args = list(args),
+            kwargs = kwargs or {},
+            status = 'QUEUED',
+        ).exists():
+            return
+        Job.objects.create(
+            name = name,
+            args = list(args),
+            kwargs = kwargs or {},
+            priority = priority,
+            run_at = run_at or timezone.now(),
+            max_attempts = max_attempts,
+        )
+    transaction.on_commit(create)
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def get_retry_delay(attempts):
+    """ Exponential backoff: JOB_RETRY_SECONDS, doubled per attempt. """
+    base = getattr(settings, 'JOB_RETRY_SECONDS', 10)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 60 * 60))
+
+
+def get_lease():
+    return timedelta(seconds=getattr(settings, 'JOB_LEASE_SECONDS', 300))
+
+
+def claim(batch_size, worker_id, names=None):
+    """
+    Lock up to batch_size due jobs for this worker. Rows are taken with
+    SELECT ... FOR UPDATE SKIP LOCKED where supported; on SQLite the
+    IMMEDIATE transaction serialises claims instead. Jobs left RUNNING by
+    a dead worker are reclaimed once their lease expires, unless they have
+    used up their attempts (a job that keeps killing or hanging its
+    worker), in which case they are marked DEAD.
+    """
+    now = timezone.now()
+    lease = get_lease()
+
+    queryset = Job.objects.filter(
+        Q(status='QUEUED', run_at__lte=now)
+        | Q(
+            status = 'RUNNING',
+            locked_until__lt = now,
+            attempts__lt = F('max_attempts'),
+        )
+    )
+    if names:
+        queryset = queryset.filter(name__in=names)
+
+    with transaction.atomic():
+        Job.objects.filter(
+            status = 'RUNNING',
+            locked_until__lt = now,
+            attempts__gte = F('max_attempts'),
+        ).update(
+            status = 'DEAD',
+            last_error = 'Lease expired after the last attempt.',
+            locked_by = None,
+            locked_until = None,
+            finished_at = now,
+        )
+        ids = list(
+            queryset.select_for_update(
+                skip_locked = True,
+            ).order_by(
+                '-priority', 'run_at', 'pk',
+            ).values_list(
+                'pk', flat=True,
+            )[:batch_size]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids).update(
+            status = 'RUNNING',
+            locked_by = worker_id,
+            locked_until = now + lease,
+            attempts = F('attempts') + 1,
+        )
+        return list(
+            Job.objects.filter(pk__in=ids).order_by('-priority', 'run_at', 'pk')
+        )
+
+
+class LeaseKeeper(threading.Thread):
+    """
+    Extend the leases of a worker's RUNNING jobs every third of
+    JOB_LEASE_SECONDS until stopped, so jobs that run (or wait in a
+    claimed batch) longer than the lease are not reclaimed by another
+    worker while this one is alive.
+    """
+
+    def __init__(self, worker_id):
+        super().__init__(name=f'lease-{worker_id}', daemon=True)
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        lease = get_lease()
+        try:
+            while not self.stopped.wait(lease.total_seconds() / 3):
+                try:
+                    Job.objects.filter(
+                        status = 'RUNNING',
+                        locked_by = self.worker_id,
+                    ).update(
+                        locked_until = timezone.now() + lease,
+                    )
+                except Exception as ex:
+                    logger.error(
+                        f'Lease renewal of {self.worker_id} failed: {ex}'
+                    )
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def finish(job, **fields):
+    """
+    Record a job's outcome if this worker still holds it. False when the
+    lease was lost to another worker or the write failed; the job is then
+    left to its current owner or to lease expiry.
+    """
+    try:
+        updated = Job.objects.filter(
+            pk = job.pk,
+            status = 'RUNNING',
+            locked_by = job.locked_by,
+        ).update(
+            locked_by = None,
+            locked_until = None,
+            **fields,
+        )
+    except Exception as ex:
+        logger.error(f'Job {job.pk} {job.name}: recording outcome failed: {ex}')
+        return False
+    if not updated:
+        logger.warning(f'Job {job.pk} {job.name}: lease lost, outcome dropped')
+    return bool(updated)
+
+
+def execute(job, metrics=None):
+    """ Run one claimed job and record its outcome. """
+    func = registry.get(job.name)
+    started = time.perf_counter()
+    try:
+        if func is None:
+            raise LookupError(f'Unknown job type: {job.name}')
+        func(*job.args, **job.kwargs)
+    except Exception as ex:
+        logger.error(f'Job {job.pk} {job.name} failed: {ex}')
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts or func is None:
+            outcome = 'dead'
+            recorded = finish(
+                job,
+                status = 'DEAD',
+                last_error = job.last_error,
+                finished_at = timezone.now(),
+            )
+        else:
+            outcome = 'retried'
+            recorded = finish(
+                job,
+                status = 'QUEUED',
+                last_error = job.last_error,
+                run_at = timezone.now() + get_retry_delay(job.attempts),
+            )
+    else:
+        outcome = 'done'
+        recorded = finish(
+            job,
+            status = 'DONE',
+            finished_at = timezone.now(),
+        )
+    finally:
+        close_old_connections()
+
+    if not recorded:
+        outcome = 'lost'
+    if metrics is not None:
+        metrics.record(job.name, outcome, time.perf_counter() - started)
+    return outcome
+
+
+class Metrics:
+    """ Thread-safe per-job-type counters and run time. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stats = {}
+
+    def record(self, name, outcome, seconds):
+        with self.lock:
+            stats = self.stats.setdefault(name, {
+                'done': 0,
+                'retried': 0,
+                'dead': 0,
+                'lost': 0,
+                'seconds': 0.0,
+            })
+            stats[outcome] += 1
+            stats['seconds'] += seconds
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        lines = []
+        with self.lock:
+            for name, stats in sorted(self.stats.items()):
+                runs = (
+                    stats['done'] + stats['retried'] + stats['dead']
+                    + stats['lost']
+                )
+                lines.append(
+                    f'{name}: {stats["done"]} done, '
+                    f'{stats["retried"]} retried, {stats["dead"]} dead, '
+                    f'{stats["lost"]} lost, '
+                    f'{runs / elapsed if elapsed else 0:.1f} jobs/s, '
+                    f'{stats["seconds"] / runs * 1000 if runs else 0:.1f} '
+                    f'ms avg'
+                )
+        return lines
@@ -0,0 +1,87 @@
+
+import statistics, time
+
+from django.conf import settings
+from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.utils import translation
+
+from app.fragments import find_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Time loading and rendering each template with and without the '
+        'cached loader'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'patterns',
+            nargs = '*',
+            default = ['account/*.html'],
+            help = 'Template name globs under the template DIRS',
+        )
+        parser.add_argument(
+            '--iterations',
+            type = int,
+            default = 200,
+        )
+
+    def get_engine(self, cached):
+        options = dict(settings.TEMPLATES[0].get('OPTIONS', {}))
+        loaders = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+        if cached:
+            loaders = [('django.template.loaders.cached.Loader', loaders)]
+        options['loaders'] = loaders
+        return DjangoTemplates({
+            'NAME': 'cached' if cached else 'uncached',
+            'DIRS': settings.TEMPLATES[0]['DIRS'],
+            'APP_DIRS': False,
+            'OPTIONS': options,
+        })
+
+    def time(self, engine, name, request):
+        timings = []
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            engine.get_template(name).render({'form': self.form}, request)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (
+            statistics.mean(timings),
+            timings[int(len(timings) * 0.95) - 1],
+        )
+
+    def handle(self, *args, **kwargs):
+        self.iterations = kwargs['iterations']
+        self.form = AuthenticationForm()
+
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        request.user = AnonymousUser()
+        request.session = {}
+
+        uncached = self.get_engine(cached=False)
+        cached = self.get_engine(cached=True)
+
+        self.stdout.write(
+            f'{"template":<32} {"lang":<5} {"uncached":>18} {"cached":>18}'
+        )
+        for name in find_templates(kwargs['patterns']):
+            for language, _language_name in settings.LANGUAGES:
+                with translation.override(language):
+                    cold = self.time(uncached, name, request)
+                    warm = self.time(cached, name, request)
+                self.stdout.write(
+                    f'{name:<32} {language:<5} '
+                    f'{cold[0]:>7.3f}ms p95 {cold[1]:>6.3f} '
+                    f'{warm[0]:>7.3f}ms p95 {warm[1]:>6.3f}'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished!'))
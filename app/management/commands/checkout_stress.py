@@ -0,0 +1,102 @@
+
+import time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from app.checkout import OutOfStock, checkout
+from app.models import *
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent checkouts against one product and check stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=10)
+        parser.add_argument('--shoppers', type=int, default=50)
+        parser.add_argument('--quantity', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--keep',
+            action = 'store_true',
+            help = 'Keep the generated users, product and orders',
+        )
+
+    def handle(self, *args, **kwargs):
+        prefix = f'stress_{uuid.uuid4().hex[:8]}'
+
+        # A distinct email: create_user stores '' for a missing one, which
+        # collides with the unique constraint on a second run.
+        owner = User.objects.create_user(
+            username = f'{prefix}_vendor',
+            email = f'{prefix}_vendor@example.com',
+        )
+        vendor = Vendor.objects.create(user=owner, store_name=prefix)
+        product = Product.objects.create(
+            vendor = vendor,
+            name = prefix,
+            price = 10,
+            stock = kwargs['stock'],
+        )
+
+        shoppers = User.objects.bulk_create([
+            User(username=f'{prefix}_{i}')
+            for i in range(kwargs['shoppers'])
+        ])
+        carts = Cart.objects.bulk_create([
+            Cart(user=shopper, vendor=vendor) for shopper in shoppers
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=kwargs['quantity'])
+            for cart in carts
+        ])
+
+        def attempt(cart):
+            try:
+                checkout(cart)
+                return 'ordered'
+            except OutOfStock:
+                return 'out_of_stock'
+            except DatabaseError:
+                return 'contended'
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=kwargs['threads']) as executor:
+            results = list(executor.map(attempt, carts))
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        ordered = Order.objects.filter(vendor=vendor).count()
+        sold = sum(
+            OrderItem.objects.filter(
+                order__vendor = vendor,
+            ).values_list('quantity', flat=True)
+        )
+
+        self.stdout.write(
+            f'{len(carts)} checkouts in {elapsed:.2f}s: '
+            f'{results.count("ordered")} ordered, '
+            f'{results.count("out_of_stock")} out of stock, '
+            f'{results.count("contended")} contended; '
+            f'stock left {product.stock}'
+        )
+
+        consistent = (
+            ordered == results.count('ordered')
+            and sold + product.stock == kwargs['stock']
+            and sold <= kwargs['stock']
+        )
+
+        if not kwargs['keep']:
+            User.objects.filter(username__startswith=prefix).delete()
+
+        if not consistent:
+            raise CommandError(
+                f'Stock mismatch: sold {sold}, left {product.stock}, '
+                f'initial {kwargs["stock"]}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('No overselling detected!'))
@@ -0,0 +1,242 @@
+
+import csv, gzip, json, os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app.models import *
+
+
+# table -> (model, exported fields, path to the owning Order)
+TABLES = {
+    'orders': (
+        Order,
+        [
+            'id', 'user_id', 'vendor_id', 'total_price', 'is_paid',
+            'status', 'created_at', 'updated_at',
+        ],
+        '',
+    ),
+    'order_items': (
+        OrderItem,
+        [
+            'id', 'order_id', 'product_id', 'product_variant_id',
+            'quantity', 'price',
+        ],
+        'order__',
+    ),
+    'payments': (
+        Payment,
+        [
+            'id', 'order_id', 'payment_method_id', 'amount',
+            'payment_date', 'status',
+        ],
+        'order__',
+    ),
+    'voucher_usages': (
+        VoucherUsage,
+        [
+            'id', 'voucher_id', 'payment_id', 'applied_amount',
+            'created_at',
+        ],
+        'payment__order__',
+    ),
+}
+
+
+class CsvPartition:
+
+    extension = 'csv.gz'
+
+    def __init__(self, path, model, fields):
+        self.file = gzip.open(path, 'wt', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(fields)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPartition:
+
+    extension = 'parquet'
+
+    def __init__(self, path, model, fields):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            (name, self.get_type(model, name)) for name in fields
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def get_type(self, model, name):
+        pa = self.pa
+        field = model._meta.get_field(name)
+        if isinstance(field, models.ForeignKey):
+            return pa.int64()
+        if isinstance(field, models.DecimalField):
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if isinstance(field, models.IntegerField):
+            return pa.int64()
+        if isinstance(field, models.BooleanField):
+            return pa.bool_()
+        if isinstance(field, models.DateTimeField):
+            return pa.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+        return pa.string()
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(
+            self.pa.Table.from_arrays(
+                [
+                    self.pa.array(column, type=field.type)
+                    for column, field in zip(columns, self.schema)
+                ],
+                schema = self.schema,
+            )
+        )
+
+    def close(self):
+        self.writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream orders, order items, payments and voucher usages into '
+        'compressed files partitioned by day and vendor'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help = 'Export directory; also holds the watermark file',
+        )
+        parser.add_argument(
+            '--format',
+            choices = ['csv', 'parquet'],
+            default = 'csv',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type = int,
+            default = 5000,
+        )
+        parser.add_argument(
+            '--tables',
+            nargs = '+',
+            choices = list(TABLES),
+            default = list(TABLES),
+        )
+        parser.add_argument(
+            '--full',
+            action = 'store_true',
+            help = 'Ignore the watermark and export everything',
+        )
+
+    def handle(self, *args, **kwargs):
+        output = kwargs['output']
+        partition_class = CsvPartition
+        if kwargs['format'] == 'parquet':
+            try:
+                import pyarrow
+            except ImportError:
+                raise CommandError('The parquet format requires pyarrow')
+            partition_class = ParquetPartition
+
+        watermark_path = os.path.join(output, '_watermark.json')
+        watermarks = {}
+        if os.path.exists(watermark_path) and not kwargs['full']:
+            with open(watermark_path) as file:
+                watermarks = json.load(file)
+
+        until = timezone.now()
+        run = until.strftime('%Y%m%dT%H%M%S')
+
+        for table in kwargs['tables']:
+            since = parse_datetime(watermarks.get(table, '') or '')
+            count = self.export_table(
+                table, output, run, since, until, partition_class,
+                kwargs['chunk_size'],
+            )
+            watermarks[table] = until.isoformat()
+            self.stdout.write(f'{table}: {count} rows')
+
+        os.makedirs(output, exist_ok=True)
+        with open(watermark_path, 'w') as file:
+            json.dump(watermarks, file, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Exported up to {until.isoformat()}!')
+        )
+
+    def export_table(
+        self, table, output, run, since, until, partition_class, chunk_size,
+    ):
+        """
+        Rows arrive ordered by (day, vendor), so only one partition file is
+        open at a time and at most one chunk of rows is held in memory.
+        """
+        model, fields, prefix = TABLES[table]
+
+        queryset = model.objects.filter(**{
+            f'{prefix}updated_at__lte': until,
+        })
+        if since:
+            queryset = queryset.filter(**{f'{prefix}updated_at__gt': since})
+
+        rows = queryset.annotate(
+            export_day = TruncDate(f'{prefix}created_at'),
+            export_vendor = F(f'{prefix}vendor_id'),
+        ).order_by(
+            'export_day', 'export_vendor', 'pk',
+        ).values_list(
+            'export_day', 'export_vendor', *fields,
+        ).iterator(chunk_size=chunk_size)
+
+        partition = None
+        key = None
+        buffer = []
+        count = 0
+
+        for row in rows:
+            if (row[0], row[1]) != key:
+                if partition:
+                    if buffer:
+                        partition.write(buffer)
+                    partition.close()
+                buffer = []
+                key = (row[0], row[1])
+                folder = os.path.join(
+                    output, table, f'date={key[0]}', f'vendor={key[1]}',
+                )
+                os.makedirs(folder, exist_ok=True)
+                partition = partition_class(
+                    os.path.join(
+                        folder, f'part-{run}.{partition_class.extension}',
+                    ),
+                    model,
+                    fields,
+                )
+
+            buffer.append(row[2:])
+            count += 1
+            if len(buffer) >= chunk_size:
+                partition.write(buffer)
+                buffer = []
+
+        if partition:
+            if buffer:
+                partition.write(buffer)
+            partition.close()
+
+        return count
@@ -0,0 +1,86 @@
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from app.models import *
+from app.thumbnails import get_config, get_targets, render_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails for existing product images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type = int,
+            default = os.cpu_count(),
+        )
+        parser.add_argument(
+            '--force',
+            action = 'store_true',
+            help = 'Regenerate thumbnails that are already up to date',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type = int,
+            default = 500,
+            help = 'Images submitted to the pool at a time',
+        )
+
+    def handle(self, *args, **kwargs):
+        config = get_config()
+
+        def get_names():
+            querysets = [
+                ProductImage.objects.exclude(file='').values_list(
+                    'file', flat=True,
+                ),
+                User.objects.exclude(avatar='').values_list(
+                    'avatar', flat=True,
+                ),
+            ]
+            for queryset in querysets:
+                for name in queryset.iterator(chunk_size=1000):
+                    if name:
+                        yield name
+
+        generated = 0
+        failed = 0
+        total = 0
+        names = get_names()
+
+        with ProcessPoolExecutor(max_workers=kwargs['workers']) as executor:
+            # Bounded chunks keep memory flat however large the library.
+            while chunk := list(islice(names, kwargs['chunk_size'])):
+                futures = {
+                    executor.submit(
+                        render_thumbnails,
+                        default_storage.path(name),
+                        get_targets(name, config),
+                        config['format'],
+                        config['quality'],
+                        kwargs['force'],
+                    ): name
+                    for name in chunk
+                }
+                total += len(futures)
+
+                for future in as_completed(futures):
+                    try:
+                        generated += future.result()
+                    except Exception as ex:
+                        failed += 1
+                        self.stdout.write(
+                            self.style.ERROR(f'{futures[future]}: {ex}'),
+                        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated {generated} thumbnails '
+                f'for {total} images ({failed} failed)!'
+            )
+        )
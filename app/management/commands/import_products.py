@@ -0,0 +1,47 @@
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importer import ProductImporter, read_rows
+from app.models import *
+
+
+class Command(BaseCommand):
+    help = 'Upsert a vendor\'s products by SKU from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor_id', type=int)
+        parser.add_argument('file')
+        parser.add_argument(
+            '--format',
+            choices = ['csv', 'jsonl'],
+            help = 'Defaults to the file extension',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 1000,
+        )
+        parser.add_argument(
+            '--max-errors',
+            type = int,
+            default = 50,
+            help = 'Number of row errors to print',
+        )
+
+    def handle(self, *args, **kwargs):
+        vendor = Vendor.objects.filter(pk=kwargs['vendor_id']).first()
+        if vendor is None:
+            raise CommandError(f'Vendor {kwargs["vendor_id"]} does not exist')
+
+        file_format = kwargs['format'] or (
+            'jsonl' if kwargs['file'].endswith(('.jsonl', '.json')) else 'csv'
+        )
+
+        importer = ProductImporter(vendor, kwargs['batch_size'])
+        with open(kwargs['file'], 'rb') as file:
+            result = importer.run(read_rows(file, file_format))
+
+        for line_no, error in result.errors[:kwargs['max_errors']]:
+            self.stdout.write(self.style.ERROR(f'Line {line_no}: {error}'))
+
+        self.stdout.write(self.style.SUCCESS(str(result)))
@@ -1,13 +1,17 @@
 
-import random, requests
+import random
 
 from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
 from django.db import transaction
 
 from faker import Faker
 
 from app.models import *
+from app.tasks import (
+    download_file,
+    recalculate_order,
+    recalculate_payment,
+)
 
 
 RECORD = 3
@@ -49,17 +53,13 @@ class Command(BaseCommand):
                     placeholder_url = 'https://picsum.photos/{width}/{height}'
                 )
 
-                try:
-                    response = requests.get(avatar_url)
-                    user.avatar.save(
-                        f'{faker.uuid4()}.jpg',
-                        ContentFile(response.content),
-                        save=True,
-                    )
-                except Exception as ex:
-                    self.stdout.write(
-                        self.style.ERROR(ex),
-                    )
+                download_file.delay(
+                    'app.User',
+                    user.pk,
+                    'avatar',
+                    avatar_url,
+                    f'{faker.uuid4()}.jpg',
+                )
 
                 if user.is_vendor:
                     Vendor.objects.create(
@@ -193,17 +193,13 @@ class Command(BaseCommand):
                             'https://picsum.photos/{width}/{height}'
                         )
                     )
-                    try:
-                        response = requests.get(product_image_url)
-                        image.file.save(
-                            f'{faker.uuid4()}.jpg',
-                            ContentFile(response.content),
-                            save=True,
-                        )
-                    except Exception as ex:
-                        self.stdout.write(
-                            self.style.ERROR(ex),
-                        )
+                    download_file.delay(
+                        'app.ProductImage',
+                        image.pk,
+                        'file',
+                        product_image_url,
+                        f'{faker.uuid4()}.jpg',
+                    )
 
                     images.append(image)
 
@@ -419,11 +415,10 @@ class Command(BaseCommand):
                         quantity = quantity,
                     )
 
-                    order_item.calculate_price()
-                    order_item.order.calculate_total_price()
-
                     order_items.append(order_item)
 
+                recalculate_order.delay(order.pk)
+
             self.stdout.write(
                 self.style.SUCCESS(f'Created {len(order_items)} order items!')
             )
@@ -520,7 +515,7 @@ class Command(BaseCommand):
 
                     voucher_usages.append(voucher_usage)
 
-                payment.calculate_payment_amount()
+                recalculate_payment.delay(payment.pk)
 
             self.stdout.write(
                 self.style.SUCCESS(
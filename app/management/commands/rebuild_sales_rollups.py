@@ -0,0 +1,48 @@
+
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute vendor and product daily sales for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type = date.fromisoformat,
+            help = 'First day (YYYY-MM-DD), defaults to 30 days ago',
+        )
+        parser.add_argument(
+            '--end',
+            type = date.fromisoformat,
+            help = 'Last day (YYYY-MM-DD), defaults to today',
+        )
+        parser.add_argument(
+            '--days-per-batch',
+            type = int,
+            default = 7,
+        )
+
+    def handle(self, *args, **kwargs):
+        end = kwargs['end'] or timezone.localdate()
+        start = kwargs['start'] or end - timedelta(days=29)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        # One transaction per batch of days keeps locks short.
+        batch_start = start
+        while batch_start <= end:
+            batch_end = min(
+                batch_start + timedelta(days=kwargs['days_per_batch'] - 1),
+                end,
+            )
+            rebuild(batch_start, batch_end)
+            batch_start = batch_end + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt sales rollups from {start} to {end}!')
+        )
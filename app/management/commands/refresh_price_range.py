@@ -0,0 +1,39 @@
+
+from django.core.management.base import BaseCommand
+
+from app.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Backfill Product.min_price/max_price from price and variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 1000,
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+
+        product_ids = Product.objects.order_by('pk').values_list(
+            'pk', flat=True,
+        )
+
+        updated = 0
+        last_id = 0
+
+        while True:
+            batch = list(product_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            updated += Product.objects.filter(
+                pk__range = (batch[0], batch[-1]),
+            ).refresh_price_range()
+            last_id = batch[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshed price range for {updated} products!')
+        )
@@ -0,0 +1,61 @@
+
+from django.core.management.base import BaseCommand
+
+from app.models import User, Vendor
+from app.search import normalize_search
+
+
+class Command(BaseCommand):
+    help = 'Backfill the normalized search_* columns of users and vendors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 1000,
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+
+        for model in (User, Vendor):
+            columns = model.SEARCH_FIELDS
+            queryset = model.objects.order_by('pk').only(
+                'pk', *columns, *columns.values(),
+            )
+
+            updated = 0
+            last_id = 0
+
+            while True:
+                batch = list(queryset.filter(pk__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+
+                changed = []
+                for instance in batch:
+                    values = {
+                        target: normalize_search(
+                            getattr(instance, source),
+                            model._meta.get_field(target).max_length,
+                        )
+                        for source, target in columns.items()
+                    }
+                    if any(
+                        getattr(instance, target) != value
+                        for target, value in values.items()
+                    ):
+                        for target, value in values.items():
+                            setattr(instance, target, value)
+                        changed.append(instance)
+
+                if changed:
+                    model.objects.bulk_update(changed, list(columns.values()))
+                    updated += len(changed)
+                last_id = batch[-1].pk
+
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {updated} updated'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Refreshed search columns!'))
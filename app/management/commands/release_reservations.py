@@ -0,0 +1,33 @@
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return stock held by expired reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 1000,
+        )
+        parser.add_argument(
+            '--interval',
+            type = float,
+            default = 0,
+            help = 'Keep sweeping every N seconds instead of running once',
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            released = release_expired(kwargs['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Released {released} reserved units!')
+            )
+            if not kwargs['interval']:
+                break
+            time.sleep(kwargs['interval'])
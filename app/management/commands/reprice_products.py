@@ -0,0 +1,84 @@
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import *
+from app.pricing import ROUNDING, get_products, reprice
+
+
+class Command(BaseCommand):
+    help = (
+        'Change the price of every product of a vendor and/or category '
+        'subtree with a single UPDATE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vendor',
+            type = int,
+            nargs = '+',
+            default = [],
+            help = 'Vendor ids',
+        )
+        parser.add_argument(
+            '--category',
+            type = int,
+            nargs = '+',
+            default = [],
+            help = 'Category ids; their subcategories are included',
+        )
+        parser.add_argument(
+            '--percent',
+            type = Decimal,
+            help = 'Percentage change, e.g. -20 for a 20%% sale',
+        )
+        parser.add_argument(
+            '--amount',
+            type = Decimal,
+            help = 'Absolute change, applied after --percent',
+        )
+        parser.add_argument(
+            '--rounding',
+            choices = list(ROUNDING),
+            default = 'cents',
+            help = (
+                'cents, whole units, or ninety_nine: down to the nearest '
+                'price ending in .99 (10.00 -> 9.99, 10.50 -> 9.99)'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action = 'store_true',
+            help = 'Only report how many products would change',
+        )
+
+    def handle(self, *args, **kwargs):
+        if not (kwargs['vendor'] or kwargs['category']):
+            raise CommandError('Select products with --vendor or --category')
+        if kwargs['percent'] is None and kwargs['amount'] is None:
+            raise CommandError('Give --percent and/or --amount')
+        if kwargs['percent'] is not None and kwargs['percent'] < -100:
+            raise CommandError('--percent cannot be below -100')
+
+        products = get_products(
+            vendors = kwargs['vendor'] or None,
+            categories = (
+                Category.objects.filter(pk__in=kwargs['category'])
+                if kwargs['category'] else None
+            ),
+        )
+        count = reprice(
+            products,
+            percent = kwargs['percent'],
+            amount = kwargs['amount'],
+            rounding = kwargs['rounding'],
+            dry_run = kwargs['dry_run'],
+        )
+
+        if kwargs['dry_run']:
+            self.stdout.write(f'{count} products would be repriced')
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Repriced {count} products!')
+            )
@@ -0,0 +1,42 @@
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.outbox import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches over one connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 100,
+        )
+        parser.add_argument(
+            '--interval',
+            type = float,
+            default = 0,
+            help = 'Keep polling every N seconds instead of running once',
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            # Drain everything that is due before reporting or sleeping.
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = send_pending(kwargs['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < kwargs['batch_size']:
+                    break
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Sent {total_sent} emails ({total_failed} failed)!'
+                )
+            )
+            if not kwargs['interval']:
+                break
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,72 @@
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import *
+from app.orders import BATCH_SIZE, transition
+
+
+class Command(BaseCommand):
+    help = 'Move orders to a new status in bulk and record the history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'status',
+            choices = list(Order.TRANSITIONS),
+        )
+        parser.add_argument(
+            '--ids',
+            type = int,
+            nargs = '+',
+            default = [],
+        )
+        parser.add_argument(
+            '--file',
+            help = 'Text file with one order id per line',
+        )
+        parser.add_argument(
+            '--vendor',
+            type = int,
+            help = 'Only orders of this vendor id',
+        )
+        parser.add_argument(
+            '--from-status',
+            choices = list(Order.TRANSITIONS),
+            help = 'Only orders currently in this status',
+        )
+
+    def handle(self, *args, **kwargs):
+        ids = list(kwargs['ids'])
+        if kwargs['file']:
+            with open(kwargs['file']) as file:
+                ids += [int(line) for line in file if line.strip()]
+
+        if not (ids or kwargs['vendor'] or kwargs['from_status']):
+            raise CommandError(
+                'Select orders with --ids, --file, --vendor or --from-status'
+            )
+
+        queryset = Order.objects.all()
+        if kwargs['vendor']:
+            queryset = queryset.filter(vendor_id=kwargs['vendor'])
+        if kwargs['from_status']:
+            queryset = queryset.filter(status=kwargs['from_status'])
+
+        if not ids:
+            changed, skipped = transition(queryset, kwargs['status'])
+        else:
+            # Id lists from --file can be huge; keep each IN () bounded.
+            changed = skipped = 0
+            for start in range(0, len(ids), BATCH_SIZE):
+                batch_changed, batch_skipped = transition(
+                    queryset.filter(pk__in=ids[start:start + BATCH_SIZE]),
+                    kwargs['status'],
+                )
+                changed += batch_changed
+                skipped += batch_skipped
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Moved {changed} orders to {kwargs["status"]} '
+                f'({skipped} skipped)!'
+            )
+        )
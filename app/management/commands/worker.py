@@ -0,0 +1,120 @@
+import logging, threading
+import logging, threading, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app.jobs import (
+    LeaseKeeper,
+    Metrics,
+    claim,
+    execute,
+    get_worker_id,
+    registry,
+)
+
+
+logger = logging.getLogger('app')
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs on a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type = int,
+            default = 4,
+        )
+        parser.add_argument(
+            '--batch-size',
+            type = int,
+            default = 10,
+            help = 'Jobs claimed per thread at a time',
+        )
+        parser.add_argument(
+            '--queues',
+            nargs = '+',
+            help = 'Only run these job types',
+        )
+        parser.add_argument(
+            '--interval',
+            type = float,
+            default = 1,
+            help = 'Seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--report-interval',
+            type = float,
+            default = 60,
+            help = 'Seconds between throughput reports',
+        )
+        parser.add_argument(
+            '--once',
+            action = 'store_true',
+            help = 'Exit once no job is due',
+        )
+
+    def handle(self, *args, **kwargs):
+        unknown = set(kwargs['queues'] or []) - set(registry)
+        if unknown:
+            raise CommandError(f'Unknown job types: {", ".join(unknown)}')
+
+        self.metrics = Metrics()
+        self.stop = threading.Event()
+
+        threads = [
+            threading.Thread(
+                target = self.work,
+                args = (kwargs,),
+                name = f'worker-{index}',
+            )
+            for index in range(kwargs['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(kwargs['report_interval'] / len(threads))
+                if not kwargs['once']:
+                    self.report()
+        except KeyboardInterrupt:
+            # Let running jobs finish; unfinished claims are retried
+            # after their lease expires.
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.report()
+        self.stdout.write(self.style.SUCCESS('Worker stopped!'))
+
+    def work(self, kwargs):
+        worker_id = get_worker_id()
+        leases = LeaseKeeper(worker_id)
+        leases.start()
+        try:
+            while not self.stop.is_set():
+                try:
+                    jobs = claim(
+                        kwargs['batch_size'], worker_id, kwargs['queues'],
+                    )
+                except Exception as ex:
+                    logger.error(f'Claiming jobs failed: {ex}')
+                    close_old_connections()
+                    self.stop.wait(kwargs['interval'])
+                    continue
+                if not jobs:
+                    if kwargs['once']:
+                        return
+                    self.stop.wait(kwargs['interval'])
+                    continue
+                for job in jobs:
+                    execute(job, self.metrics)
+        finally:
+            leases.stop()
+
+    def report(self):
+        for line in self.metrics.report():
+            self.stdout.write(line)
@@ -0,0 +1,193 @@
+
+import mimetypes, os, re
+
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .compression import get_encodings
+from .storage import is_hashed_name
+
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_etag(stat):
+    return '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
+
+def get_cache_control(path):
+    if is_hashed_name(path):
+        return 'public, max-age=31536000, immutable'
+    return 'public, max-age={}'.format(
+        getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600),
+    )
+
+
+def is_not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # Weak comparison (RFC 9110 13.1.2): W/"x" matches "x".
+        etags = parse_etags(if_none_match)
+        return etags == ['*'] or etag.removeprefix('W/') in (
+            tag.removeprefix('W/') for tag in etags
+        )
+
+    if_modified_since = parse_http_date_safe(
+        request.headers.get('If-Modified-Since', ''),
+    )
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def parse_range(request, size, etag, mtime):
+    """
+    Return (start, end) for a single satisfiable byte range, None to send
+    the whole file, or False when the range cannot be satisfied.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+
+    # If-Range: only honour the range while the client's copy is current.
+    # Strong comparison, so a weak W/"x" never matches (RFC 9110 13.1.5).
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(mtime):
+            return None
+
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, document_root):
+    """
+    Serve a file with strong ETags, conditional GET and single byte ranges.
+    With MEDIA_SENDFILE set, only headers are produced and the front-end
+    server (X-Sendfile / X-Accel-Redirect) sends the body.
+    """
+    try:
+        full_path = safe_join(document_root, path)
+    except ValueError:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = get_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': get_cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+    if sendfile:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if sendfile == 'X-Accel-Redirect':
+            response[sendfile] = getattr(
+                settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/',
+            ) + path
+        else:
+            response[sendfile] = full_path
+        return response
+
+    byte_range = parse_range(request, stat.st_size, etag, stat.st_mtime)
+
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+        return response
+
+    start, end = byte_range or (0, stat.st_size - 1)
+    response = StreamingHttpResponse(
+        read_range(full_path, start, end),
+        status = 206 if byte_range else 200,
+        content_type = content_type,
+        headers = headers,
+    )
+    response['Content-Length'] = str(max(end - start + 1, 0))
+    if byte_range:
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(
+            start, end, stat.st_size,
+        )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    return serve_file(request, path, settings.MEDIA_ROOT)
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Serve a collected static file, or its precompressed .br/.gz sibling
+    when the client accepts it.
+    """
+    for encoding in get_encodings(request):
+        suffix = '.br' if encoding == 'br' else '.gz'
+        try:
+            full_path = safe_join(settings.STATIC_ROOT, path + suffix)
+        except ValueError:
+            raise Http404
+        if os.path.isfile(full_path):
+            response = serve_file(request, path + suffix, settings.STATIC_ROOT)
+            break
+    else:
+        response = serve_file(request, path, settings.STATIC_ROOT)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
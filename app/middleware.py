@@ -1,5 +1,14 @@
 
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.middleware.gzip import GZipMiddleware
+
+from .compression import (
+    compress_brotli_response,
+    get_encodings,
+    is_compressible,
+)
+from .pagecache import add_surrogate_keys, is_cacheable, load, store
 
 
 class BlockNormalUserMiddleware:
@@ -14,4 +23,70 @@ class BlockNormalUserMiddleware:
         ):
             raise PermissionDenied
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+class PageCacheMiddleware:
+    """
+    Serve and store responses of views decorated with @page_cache for
+    anonymous visitors. Keep it last so the language, user and messages
+    are known; entries are purged by surrogate key (see signals).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        options = getattr(request, 'page_cache', None)
+        if options:
+            store(
+                request,
+                response,
+                options['timeout'],
+                getattr(request, 'surrogate_generations', {}),
+                options['query'],
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        options = getattr(view_func, 'page_cache', None)
+        if options is None or not is_cacheable(request, options['query']):
+            return None
+        response = load(request, options['query'])
+        if response is None:
+            request.page_cache = options
+            keys = options['keys']
+            if callable(keys):
+                keys = keys(request, *view_args, **view_kwargs)
+            add_surrogate_keys(request, *keys)
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware, with its BREACH mitigation, for text responses of at
+    least COMPRESS_MIN_SIZE bytes. Clients accepting br get brotli for
+    non-HTML bodies only, since brotli has no such mitigation and HTML
+    pages carry the CSRF token. Byte-range responses (app.media) keep
+    their identity encoding so their strong ETags and ranges stay valid.
+    Keep it near the top so it sees the final body.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        if (
+            not is_compressible(content_type)
+            or response.has_header('Accept-Ranges')
+            or not response.streaming
+            and len(response.content) < getattr(
+                settings, 'COMPRESS_MIN_SIZE', 200,
+            )
+        ):
+            return response
+
+        if (
+            'br' in get_encodings(request)
+            and not content_type.lower().startswith('text/html')
+        ):
+            return compress_brotli_response(response)
+        return super().process_response(request, response)
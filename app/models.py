@@ -1,5 +1,9 @@
 
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     Permission, PermissionsMixin,
@@ -11,6 +15,8 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
+from .search import normalize_search
+
 
 class UserGroup(models.Model):
 
@@ -39,11 +45,53 @@ class UserGroup(models.Model):
         return (self.name,)
 
 
+def set_search_fields(instance, save_kwargs):
+    """
+    Refresh the normalized copies in SEARCH_FIELDS before a save, adding
+    them to update_fields when their source field is saved.
+    """
+    update_fields = save_kwargs.get('update_fields')
+    changed = []
+    for source, target in instance.SEARCH_FIELDS.items():
+        if update_fields is None or source in update_fields:
+            setattr(instance, target, normalize_search(
+                getattr(instance, source),
+                instance._meta.get_field(target).max_length,
+            ))
+            changed.append(target)
+    if update_fields is not None and changed:
+        save_kwargs['update_fields'] = {*update_fields, *changed}
+
+
 class User(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         verbose_name = _('USER')
         verbose_name_plural = _('USERS')
+        indexes = [
+            models.Index(
+                fields = ['search_username'],
+                name = 'user_search_username_idx',
+                opclasses = ['varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields = ['search_fullname'],
+                name = 'user_search_fullname_idx',
+                opclasses = ['varchar_pattern_ops'],
+            ),
+            models.Index(
+                fields = ['search_email'],
+                name = 'user_search_email_idx',
+                opclasses = ['varchar_pattern_ops'],
+            ),
+        ]
+
+    # Source field -> lowercased, accent-folded copy used by admin search.
+    SEARCH_FIELDS = {
+        'username': 'search_username',
+        'fullname': 'search_fullname',
+        'email': 'search_email',
+    }
 
     objects = UserManager()
 
@@ -129,18 +177,56 @@ class User(AbstractBaseUser, PermissionsMixin):
         default = False,
     )
 
+    updated_at = models.DateTimeField(
+        verbose_name = _('UPDATED AT'),
+        auto_now = True,
+    )
+
+    search_username = models.CharField(
+        max_length = 100,
+        editable = False,
+        default = '',
+    )
+
+    search_fullname = models.CharField(
+        max_length = 255,
+        editable = False,
+        default = '',
+    )
+
+    search_email = models.CharField(
+        max_length = 254,
+        editable = False,
+        default = '',
+    )
+
     def __str__(self):
         identity = self.fullname
         if not identity:
             identity = self.username 
         return identity
 
+    def save(self, *args, **kwargs):
+        set_search_fields(self, kwargs)
+        super().save(*args, **kwargs)
+
 
 class Vendor(models.Model):
 
     class Meta:
         verbose_name = _('VENDOR')
         verbose_name_plural = _('VENDORS')
+        indexes = [
+            models.Index(
+                fields = ['search_store_name'],
+                name = 'vendor_search_store_name_idx',
+                opclasses = ['varchar_pattern_ops'],
+            ),
+        ]
+
+    SEARCH_FIELDS = {
+        'store_name': 'search_store_name',
+    }
 
     user = models.ForeignKey(
         to = User,
@@ -165,6 +251,12 @@ class Vendor(models.Model):
         default = False
     )
 
+    search_store_name = models.CharField(
+        max_length = 255,
+        editable = False,
+        default = '',
+    )
+
     def __str__(self):
         return ('{} [{}: {}]').format(
             self.store_name,
@@ -172,6 +264,10 @@ class Vendor(models.Model):
             self.user,
         )
 
+    def save(self, *args, **kwargs):
+        set_search_fields(self, kwargs)
+        super().save(*args, **kwargs)
+
 
 class Category(models.Model):
 
@@ -206,11 +302,51 @@ class Category(models.Model):
         )
 
 
+class ProductQuerySet(models.QuerySet):
+
+    def refresh_price_range(self):
+        """ Recompute min_price/max_price in a single UPDATE. """
+        variants = ProductVariant.objects.filter(
+            product = OuterRef('pk'),
+        ).order_by().values('product')
+
+        def modifier(aggregate):
+            return Coalesce(
+                Subquery(
+                    variants.annotate(
+                        value = aggregate('price_modifier'),
+                    ).values('value'),
+                    output_field = models.DecimalField(
+                        max_digits = 10,
+                        decimal_places = 2,
+                    ),
+                ),
+                Value(Decimal('0.00')),
+                output_field = models.DecimalField(
+                    max_digits = 10,
+                    decimal_places = 2,
+                ),
+            )
+
+        return self.update(
+            min_price = F('price') + modifier(Min),
+            max_price = F('price') + modifier(Max),
+        )
+
+
 class Product(models.Model):
 
     class Meta:
         verbose_name = _('PRODUCT')
         verbose_name_plural = _('PRODUCTS')
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['vendor', 'sku'],
+                name = 'unique_vendor_sku',
+            ),
+        ]
+
+    objects = ProductQuerySet.as_manager()
 
     vendor = models.ForeignKey(
         to = Vendor,
@@ -228,6 +364,14 @@ class Product(models.Model):
         # related_name = 'product_set',
     )
 
+    # Vendor's own stable identifier, used as the import upsert key.
+    sku = models.CharField(
+        verbose_name = _('SKU'),
+        max_length = 64,
+        blank = True,
+        null = True,
+    )
+
     name = models.CharField(
         verbose_name = _('NAME'),
         max_length = 255,
@@ -250,6 +394,28 @@ class Product(models.Model):
         default = 0,
     )
 
+    # Effective selling price (price + variant modifier), kept in sync by
+    # signals so listings can sort and filter on an index.
+    min_price = models.DecimalField(
+        verbose_name = _('MIN PRICE'),
+        max_digits = 10,
+        decimal_places = 2,
+        blank = True,
+        null = True,
+        editable = False,
+        db_index = True,
+    )
+
+    max_price = models.DecimalField(
+        verbose_name = _('MAX PRICE'),
+        max_digits = 10,
+        decimal_places = 2,
+        blank = True,
+        null = True,
+        editable = False,
+        db_index = True,
+    )
+
     is_active = models.BooleanField(
         verbose_name = _('IS ACTIVE'),
         default = True,
@@ -418,10 +584,41 @@ class ProductVariant(models.Model):
     
     def get_image(self):
         """ Return the image for the variant or the default product image. """
-        if self.image:
-            return self.image.image.url
-        default_image = self.product.images.filter(is_default=True).first()
-        return default_image.image.url if default_image else None
+        return ProductVariant.get_images([self]).get(self.pk)
+
+    @staticmethod
+    def get_images(variants):
+        """
+        Map variant pk -> image URL (own image, else the product default)
+        for a list or queryset of variants in at most two queries.
+        """
+        if isinstance(variants, models.QuerySet):
+            variants = variants.only('pk', 'product_id', 'image_id')
+        variants = list(variants)
+
+        image_ids = {v.image_id for v in variants if v.image_id}
+        product_ids = {v.product_id for v in variants}
+
+        images = ProductImage.objects.filter(
+            Q(pk__in=image_ids)
+            | Q(product_id__in=product_ids, is_default=True)
+        ).exclude(
+            file = '',
+        ).exclude(
+            file__isnull = True,
+        ).only('pk', 'product_id', 'is_default', 'file')
+
+        urls = {}
+        defaults = {}
+        for image in images:
+            urls[image.pk] = image.file.url
+            if image.is_default:
+                defaults.setdefault(image.product_id, image.file.url)
+
+        return {
+            v.pk: urls.get(v.image_id) or defaults.get(v.product_id)
+            for v in variants
+        }
     
 
 class Cart(models.Model):
@@ -507,7 +704,13 @@ class CartItem(models.Model):
         )
 
     def clean(self):
-        if self.cart.vendor != self.product.vendor:
+        """ Compare vendor ids in one query instead of loading both. """
+        if not Product.objects.filter(
+            pk = self.product_id,
+            vendor_id = Subquery(
+                Cart.objects.filter(pk=self.cart_id).values('vendor_id')[:1],
+            ),
+        ).exists():
             raise ValidationError(_(
                 'THE PRODUCT\'S VENDOR DOES NOT MATCH THE CART\'S VENDOR'
             ))
@@ -584,6 +787,15 @@ class Order(models.Model):
             self.vendor,
         )
 
+    # Allowed status changes, from -> to.
+    TRANSITIONS = {
+        'PENDING': ('PROCESSING', 'CANCELLED'),
+        'PROCESSING': ('SHIPPED', 'CANCELLED'),
+        'SHIPPED': ('DELIVERED',),
+        'DELIVERED': (),
+        'CANCELLED': (),
+    }
+
     def calculate_total_price(self):
         """ Recalculate the total price of the order based on its items. """
         try:
@@ -665,6 +877,209 @@ class OrderItem(models.Model):
         self.save()
 
 
+class OrderStatusHistory(models.Model):
+
+    class Meta:
+        verbose_name = _('ORDER STATUS HISTORY')
+        verbose_name_plural = _('ORDER STATUS HISTORIES')
+        ordering = ['created_at']
+
+    order = models.ForeignKey(
+        to = Order,
+        verbose_name = _('ORDER'),
+        on_delete = models.CASCADE,
+        # related_name = 'orderstatushistory_set',
+    )
+
+    from_status = models.CharField(
+        verbose_name = _('FROM STATUS'),
+        max_length = 20,
+    )
+
+    to_status = models.CharField(
+        verbose_name = _('TO STATUS'),
+        max_length = 20,
+    )
+
+    changed_by = models.ForeignKey(
+        to = User,
+        verbose_name = _('CHANGED BY'),
+        on_delete = models.SET_NULL,
+        blank = True,
+        null = True,
+        # related_name = 'orderstatushistory_set',
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name = _('CREATED AT'),
+        auto_now_add = True,
+    )
+
+    def __str__(self):
+        return ('{}: #{} [{} -> {}]').format(
+            _('ORDER STATUS'),
+            self.order_id,
+            self.from_status,
+            self.to_status,
+        )
+
+
+class VendorDailySales(models.Model):
+
+    class Meta:
+        verbose_name = _('VENDOR DAILY SALES')
+        verbose_name_plural = _('VENDOR DAILY SALES')
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['vendor', 'date'],
+                name = 'unique_vendor_daily_sales',
+            ),
+        ]
+
+    vendor = models.ForeignKey(
+        to = Vendor,
+        verbose_name = _('VENDOR'),
+        on_delete = models.CASCADE,
+        # related_name = 'vendordailysales_set',
+    )
+
+    date = models.DateField(
+        verbose_name = _('DATE'),
+    )
+
+    revenue = models.DecimalField(
+        verbose_name = _('REVENUE'),
+        max_digits = 14,
+        decimal_places = 2,
+        default = 0,
+    )
+
+    units = models.IntegerField(
+        verbose_name = _('UNITS'),
+        default = 0,
+    )
+
+    orders = models.IntegerField(
+        verbose_name = _('ORDERS'),
+        default = 0,
+    )
+
+    def __str__(self):
+        return ('{} [{}] - ${}').format(
+            self.vendor_id,
+            self.date,
+            self.revenue,
+        )
+
+
+class ProductDailySales(models.Model):
+
+    class Meta:
+        verbose_name = _('PRODUCT DAILY SALES')
+        verbose_name_plural = _('PRODUCT DAILY SALES')
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['product', 'date'],
+                name = 'unique_product_daily_sales',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'date']),
+        ]
+
+    vendor = models.ForeignKey(
+        to = Vendor,
+        verbose_name = _('VENDOR'),
+        on_delete = models.CASCADE,
+        # related_name = 'productdailysales_set',
+    )
+
+    product = models.ForeignKey(
+        to = Product,
+        verbose_name = _('PRODUCT'),
+        on_delete = models.CASCADE,
+        # related_name = 'productdailysales_set',
+    )
+
+    date = models.DateField(
+        verbose_name = _('DATE'),
+    )
+
+    revenue = models.DecimalField(
+        verbose_name = _('REVENUE'),
+        max_digits = 14,
+        decimal_places = 2,
+        default = 0,
+    )
+
+    units = models.IntegerField(
+        verbose_name = _('UNITS'),
+        default = 0,
+    )
+
+    orders = models.IntegerField(
+        verbose_name = _('ORDERS'),
+        default = 0,
+    )
+
+    def __str__(self):
+        return ('{} [{}] - ${}').format(
+            self.product_id,
+            self.date,
+            self.revenue,
+        )
+
+
+class StockReservation(models.Model):
+
+    class Meta:
+        verbose_name = _('STOCK RESERVATION')
+        verbose_name_plural = _('STOCK RESERVATIONS')
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['cart', 'product']),
+        ]
+
+    product = models.ForeignKey(
+        to = Product,
+        verbose_name = _('PRODUCT'),
+        on_delete = models.CASCADE,
+        # related_name = 'stockreservation_set',
+    )
+
+    # Deleting the owner keeps the row so the sweeper returns its stock.
+    cart = models.ForeignKey(
+        to = Cart,
+        verbose_name = _('CART'),
+        on_delete = models.SET_NULL,
+        blank = True,
+        null = True,
+        # related_name = 'stockreservation_set',
+    )
+
+    quantity = models.PositiveIntegerField(
+        verbose_name = _('QUANTITY'),
+    )
+
+    expires_at = models.DateTimeField(
+        verbose_name = _('EXPIRES AT'),
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name = _('CREATED AT'),
+        auto_now_add = True,
+    )
+
+    def __str__(self):
+        return ('{}: {} x{} [{}: {}]').format(
+            _('STOCK RESERVATION'),
+            self.product_id,
+            self.quantity,
+            _('EXPIRES AT'),
+            self.expires_at,
+        )
+
+
 class PaymentMethod(models.Model):
 
     class Meta:
@@ -868,3 +1283,187 @@ class VoucherUsage(models.Model):
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+
+
+class OutgoingEmail(models.Model):
+
+    class Meta:
+        verbose_name = _('OUTGOING EMAIL')
+        verbose_name_plural = _('OUTGOING EMAILS')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    subject = models.CharField(
+        verbose_name = _('SUBJECT'),
+        max_length = 255,
+    )
+
+    body = models.TextField(
+        verbose_name = _('BODY'),
+    )
+
+    html_body = models.TextField(
+        verbose_name = _('HTML BODY'),
+        blank = True,
+        null = True,
+    )
+
+    from_email = models.CharField(
+        verbose_name = _('FROM EMAIL'),
+        max_length = 255,
+        blank = True,
+        null = True,
+    )
+
+    to = models.JSONField(
+        verbose_name = _('TO'),
+    )
+
+    status = models.CharField(
+        verbose_name = _('STATUS'),
+        max_length = 20,
+        choices = (
+            ('PENDING', _('PENDING')),
+            ('SENT', _('SENT')),
+            ('FAILED', _('FAILED')),
+        ),
+        default = 'PENDING',
+    )
+
+    attempts = models.PositiveIntegerField(
+        verbose_name = _('ATTEMPTS'),
+        default = 0,
+    )
+
+    # Also used as a lease: a worker pushes it forward while sending.
+    next_attempt_at = models.DateTimeField(
+        verbose_name = _('NEXT ATTEMPT AT'),
+        default = timezone.now,
+    )
+
+    last_error = models.TextField(
+        verbose_name = _('LAST ERROR'),
+        blank = True,
+        null = True,
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name = _('CREATED AT'),
+        auto_now_add = True,
+    )
+
+    sent_at = models.DateTimeField(
+        verbose_name = _('SENT AT'),
+        blank = True,
+        null = True,
+    )
+
+    def __str__(self):
+        return ('{}: {} [{}: {}]').format(
+            _('OUTGOING EMAIL'),
+            self.subject,
+            _('STATUS'),
+            self.status,
+        )
+
+
+class Job(models.Model):
+
+    class Meta:
+        verbose_name = _('JOB')
+        verbose_name_plural = _('JOBS')
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['name', 'status']),
+        ]
+
+    name = models.CharField(
+        verbose_name = _('NAME'),
+        max_length = 100,
+    )
+
+    args = models.JSONField(
+        verbose_name = _('ARGS'),
+        default = list,
+        blank = True,
+    )
+
+    kwargs = models.JSONField(
+        verbose_name = _('KWARGS'),
+        default = dict,
+        blank = True,
+    )
+
+    # Higher runs first among jobs that are due.
+    priority = models.IntegerField(
+        verbose_name = _('PRIORITY'),
+        default = 0,
+    )
+
+    run_at = models.DateTimeField(
+        verbose_name = _('RUN AT'),
+        default = timezone.now,
+    )
+
+    status = models.CharField(
+        verbose_name = _('STATUS'),
+        max_length = 20,
+        choices = (
+            ('QUEUED', _('QUEUED')),
+            ('RUNNING', _('RUNNING')),
+            ('DONE', _('DONE')),
+            ('DEAD', _('DEAD')),
+        ),
+        default = 'QUEUED',
+    )
+
+    attempts = models.PositiveIntegerField(
+        verbose_name = _('ATTEMPTS'),
+        default = 0,
+    )
+
+    max_attempts = models.PositiveIntegerField(
+        verbose_name = _('MAX ATTEMPTS'),
+        default = 5,
+    )
+
+    # A RUNNING job whose lease ran out is picked up again by any worker,
+    # or marked DEAD once it has no attempts left.
+    locked_by = models.CharField(
+        verbose_name = _('LOCKED BY'),
+        max_length = 100,
+        blank = True,
+        null = True,
+    )
+
+    locked_until = models.DateTimeField(
+        verbose_name = _('LOCKED UNTIL'),
+        blank = True,
+        null = True,
+    )
+
+    last_error = models.TextField(
+        verbose_name = _('LAST ERROR'),
+        blank = True,
+        null = True,
+    )
+
+    created_at = models.DateTimeField(
+        verbose_name = _('CREATED AT'),
+        auto_now_add = True,
+    )
+
+    finished_at = models.DateTimeField(
+        verbose_name = _('FINISHED AT'),
+        blank = True,
+        null = True,
+    )
+
+    def __str__(self):
+        return ('{}: {} [{}: {}]').format(
+            _('JOB'),
+            self.name,
+            _('STATUS'),
+            self.status,
+        )
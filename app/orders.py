@@ -0,0 +1,111 @@
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import *
+from .rollups import apply_orders, is_counted
+
+
+BATCH_SIZE = 1000
+
+
+def get_sources(to_status):
+    """ Statuses an order may move to to_status from. """
+    return [
+        status
+        for status, targets in Order.TRANSITIONS.items()
+        if to_status in targets
+    ]
+
+
+def locked_batches(queryset, fields, batch_size=BATCH_SIZE):
+    """
+    Lock and yield the queryset's rows as value tuples (pk first) in pk
+    order, batch_size at a time, so no statement carries an unbounded
+    list of ids.
+    """
+    queryset = queryset.select_for_update().order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(
+                pk__gt = last_pk,
+            ).values_list('pk', *fields)[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+@transaction.atomic
+def transition(queryset, to_status, user=None):
+    """
+    Move every order of the queryset whose current status allows it to
+    to_status with one conditional UPDATE per batch, and record the
+    changes with bulk_create. Returns (changed, skipped).
+    """
+    if to_status not in Order.TRANSITIONS:
+        raise ValueError(f'Unknown order status: {to_status}')
+
+    sources = get_sources(to_status)
+    total = queryset.count()
+    changed = 0
+
+    for rows in locked_batches(
+        queryset.filter(status__in=sources), ('status', 'is_paid'),
+    ):
+        changed += Order.objects.filter(
+            pk__in = [pk for pk, _status, _is_paid in rows],
+            status__in = sources,
+        ).update(
+            status = to_status,
+            updated_at = timezone.now(),
+        )
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order_id = pk,
+                from_status = status,
+                to_status = to_status,
+                changed_by = user,
+            )
+            for pk, status, _is_paid in rows
+        ])
+
+        # Paid orders leaving the counted state come off the sales rollups.
+        apply_orders(
+            [
+                pk for pk, status, is_paid in rows
+                if is_counted(is_paid, status)
+                and not is_counted(is_paid, to_status)
+            ],
+            -1,
+        )
+
+    return changed, total - changed
+
+
+@transaction.atomic
+def mark_paid(queryset):
+    """
+    Flag the unpaid orders of the queryset as paid with one conditional
+    UPDATE per batch and add them to the sales rollups. Returns the
+    number changed.
+    """
+    changed = 0
+
+    for rows in locked_batches(queryset.filter(is_paid=False), ('status',)):
+        changed += Order.objects.filter(
+            pk__in = [pk for pk, _status in rows],
+            is_paid = False,
+        ).update(
+            is_paid = True,
+            updated_at = timezone.now(),
+        )
+
+        apply_orders(
+            [pk for pk, status in rows if is_counted(True, status)],
+        )
+
+    return changed
@@ -0,0 +1,127 @@
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import enqueue_job
+from .models import *
+
+
+logger = logging.getLogger('app')
+
+
+def enqueue_email(subject, body, to, from_email=None, html_body=None):
+    """
+    Store a message in the outbox and queue a send_emails job; the job
+    worker or the send_emails command delivers it.
+    """
+    email = OutgoingEmail.objects.create(
+        subject = subject,
+        body = body,
+        html_body = html_body,
+        from_email = from_email,
+        to = list(to),
+    )
+    enqueue_job('send_emails', unique=True)
+    return email
+
+
+def get_retry_delay(attempts):
+    """ Exponential backoff: EMAIL_RETRY_SECONDS, doubled per attempt. """
+    base = getattr(settings, 'EMAIL_RETRY_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 60 * 60 * 6))
+
+
+def claim(batch_size, now):
+    """
+    Lease up to batch_size due messages by pushing their next attempt
+    forward, so a concurrent worker does not pick them up as well.
+    """
+    lease = timedelta(seconds=getattr(settings, 'EMAIL_LEASE_SECONDS', 300))
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(
+                skip_locked = True,
+            ).filter(
+                status = 'PENDING',
+                next_attempt_at__lte = now,
+            ).order_by(
+                'next_attempt_at', 'pk',
+            )[:batch_size]
+        )
+        OutgoingEmail.objects.filter(
+            pk__in = [email.pk for email in emails],
+        ).update(next_attempt_at=now + lease)
+    return emails
+
+
+def send_pending(batch_size=100, now=None):
+    """
+    Send one batch of due messages over a single backend connection.
+    Failed messages are retried with backoff until EMAIL_MAX_ATTEMPTS.
+    Returns (sent, failed).
+    """
+    now = now or timezone.now()
+    emails = claim(batch_size, now)
+    if not emails:
+        return 0, 0
+
+    max_attempts = getattr(settings, 'EMAIL_MAX_ATTEMPTS', 5)
+    sent = []
+    failed = []
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as ex:
+        # Nothing can go out; retry the whole batch later.
+        logger.error(f'Email backend unavailable: {ex}')
+        error = str(ex)
+        failed = emails
+    else:
+        error = None
+        try:
+            for email in emails:
+                message = EmailMultiAlternatives(
+                    subject = email.subject,
+                    body = email.body,
+                    from_email = email.from_email,
+                    to = email.to,
+                    connection = connection,
+                )
+                if email.html_body:
+                    message.attach_alternative(email.html_body, 'text/html')
+                try:
+                    message.send()
+                except Exception as ex:
+                    logger.error(f'Email {email.pk} failed: {ex}')
+                    email.last_error = str(ex)
+                    failed.append(email)
+                else:
+                    sent.append(email.pk)
+        finally:
+            connection.close()
+
+    for email in failed:
+        email.attempts += 1
+        email.last_error = error or email.last_error
+        if email.attempts >= max_attempts:
+            email.status = 'FAILED'
+        email.next_attempt_at = now + get_retry_delay(email.attempts)
+
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status = 'SENT',
+        attempts = F('attempts') + 1,
+        sent_at = timezone.now(),
+        last_error = None,
+    )
+    OutgoingEmail.objects.bulk_update(
+        failed,
+        ['attempts', 'status', 'next_attempt_at', 'last_error'],
+    )
+    return len(sent), len(failed)
@@ -0,0 +1,189 @@
+
+import hashlib, re, time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+
+CSRF_TOKEN = re.compile(
+    rb'(name=["\']csrfmiddlewaretoken["\'] value=["\'])[^"\']*'
+)
+
+CSRF_PLACEHOLDER = b'\\g<1>__csrf_token__'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def page_cache(timeout=None, keys=(), query=()):
+    """
+    Cache the view's anonymous GET responses per path, language and the
+    query parameters named in query; requests with any other parameter
+    bypass the cache. keys lists surrogate keys ('product:42') or is a
+    callable (request, *args, **kwargs) returning them; views can add
+    more with add_surrogate_keys(). PageCacheMiddleware does the caching.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return view(request, *args, **kwargs)
+        wrapper.page_cache = {
+            'timeout': timeout,
+            'keys': keys,
+            'query': tuple(query),
+        }
+        return wrapper
+    return decorator
+
+
+def get_generations(keys):
+    """
+    Current generation of each surrogate key. New counters start at a
+    unique value, so one recreated after eviction never matches the
+    generation stored with an older page.
+    """
+    cache = get_cache()
+    names = {f'surrogate:{key}': key for key in keys}
+    current = cache.get_many(names)
+    missing = [name for name in names if name not in current]
+    for name in missing:
+        cache.add(name, time.time_ns(), None)
+    if missing:
+        current.update(cache.get_many(missing))
+    return {names[name]: value for name, value in current.items()}
+
+
+def add_surrogate_keys(request, *keys):
+    """
+    Tag the page being rendered. Generations are read now, before the
+    response is built, so a purge during rendering invalidates it.
+    """
+    generations = getattr(request, 'surrogate_generations', {})
+    generations.update({
+        key: generation
+        for key, generation in get_generations(
+            set(keys) - set(generations),
+        ).items()
+    })
+    request.surrogate_generations = generations
+
+
+def get_page_key(request, query=()):
+    params = sorted(
+        (name, value)
+        for name in query
+        for value in request.GET.getlist(name)
+    )
+    path = hashlib.md5(
+        f'{request.path}?{urlencode(params)}'.encode(),
+    ).hexdigest()
+    return f'page:{get_language()}:{path}'
+
+
+def is_cacheable(request, query=()):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # Unlisted parameters would each get their own copy of the page.
+        and set(request.GET) <= set(query)
+        # Pending flash messages are rendered into the page.
+        and not len(get_messages(request))
+    )
+
+
+def load(request, query=()):
+    """
+    A fresh copy of the cached response, with this visitor's CSRF token,
+    unless one of its surrogate keys was purged since it was stored.
+    """
+    cache = get_cache()
+    entry = cache.get(get_page_key(request, query))
+    if entry is None:
+        return None
+
+    response, generations = entry
+    if generations:
+        current = cache.get_many([f'surrogate:{key}' for key in generations])
+        if any(
+            current.get(f'surrogate:{key}') != generation
+            for key, generation in generations.items()
+        ):
+            return None
+
+    if b'__csrf_token__' in response.content:
+        response.content = response.content.replace(
+            b'__csrf_token__', get_token(request).encode(),
+        )
+    response['X-Page-Cache'] = 'HIT'
+    return response
+
+
+def store(request, response, timeout, generations, query=()):
+    """ Cache the response with the surrogate key generations it saw. """
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or response.has_header('Cache-Control')
+        and 'private' in response['Cache-Control']
+    ):
+        return
+
+    if timeout is None:
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+    # The token is swapped for each visitor's own on the way out.
+    cached = response.__class__(
+        CSRF_TOKEN.sub(CSRF_PLACEHOLDER, response.content),
+        status = response.status_code,
+        headers = {
+            header: value for header, value in response.items()
+            if header.lower() not in ('set-cookie', 'vary')
+        },
+    )
+
+    get_cache().set(
+        get_page_key(request, query),
+        (cached, dict(generations)),
+        timeout,
+    )
+
+    response['Surrogate-Key'] = ' '.join(sorted(generations))
+    response['X-Page-Cache'] = 'MISS'
+
+
+def purge(*keys):
+    """
+    Invalidate every cached page tagged with any of the surrogate keys by
+    bumping their generations; stale pages are dropped when next read.
+    """
+    cache = get_cache()
+    purged = 0
+    for key in set(keys):
+        try:
+            cache.incr(f'surrogate:{key}')
+        except ValueError:
+            # No counter: no stored page can still match it.
+            continue
+        purged += 1
+    return purged
+
+
+def get_surrogate_keys(instance):
+    """
+    '<model>:<pk>' for the instance plus one key per related object named
+    in PAGE_CACHE_RELATIONS, e.g. Product -> vendor:3, category:7.
+    """
+    model_name = instance._meta.model_name
+    keys = {f'{model_name}:{instance.pk}'}
+    for field in getattr(settings, 'PAGE_CACHE_RELATIONS', {}).get(model_name, []):
+        related_id = getattr(instance, f'{field}_id', None)
+        if related_id is not None:
+            keys.add(f'{field}:{related_id}')
+    return keys
@@ -0,0 +1,91 @@
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def get_estimated_count(model, using):
+    """ Planner/statistics row estimate of a whole table, or None. """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [connection.ops.quote_name(table)],
+            )
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # Only present once ANALYZE has run; every row of a table
+            # starts its 'stat' with the table's row count.
+            cursor.execute(
+                'SELECT name FROM sqlite_master '
+                'WHERE type = \'table\' AND name = \'sqlite_stat1\''
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table],
+            )
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+
+    # PostgreSQL reports -1 for tables that were never analysed.
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large tables. Unfiltered querysets use the database's
+    row estimate once it exceeds ADMIN_EXACT_COUNT_THRESHOLD, and exact
+    counts (filtered or not) are cached for ADMIN_COUNT_CACHE_SECONDS.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        threshold = getattr(settings, 'ADMIN_EXACT_COUNT_THRESHOLD', 100_000)
+
+        if not queryset.query.where:
+            estimate = get_estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > threshold:
+                return estimate
+
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'count:{}'.format(
+            hashlib.md5(f'{queryset.db}:{sql}:{params}'.encode()).hexdigest(),
+        )
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            # Small results are cheap to count and should stay exact.
+            if count > threshold // 100:
+                cache.set(
+                    key,
+                    count,
+                    getattr(settings, 'ADMIN_COUNT_CACHE_SECONDS', 300),
+                )
+        return count
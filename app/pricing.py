@@ -0,0 +1,122 @@
+
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Floor, Greatest, Round
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import *
+from .pagecache import purge
+
+
+ROUNDING = {
+    'cents': _('NEAREST CENT'),
+    'whole': _('NEAREST WHOLE UNIT'),
+    'ninety_nine': _('DOWN TO THE NEAREST .99'),
+}
+
+
+def get_subtree_ids(categories):
+    """ Ids of the given categories and all their descendants. """
+    children = {}
+    for pk, parent_id in Category.objects.values_list('pk', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+
+    ids = set()
+    pending = [category.pk for category in categories]
+    while pending:
+        pk = pending.pop()
+        if pk not in ids:
+            ids.add(pk)
+            pending.extend(children.get(pk, []))
+    return ids
+
+
+def get_products(vendors=None, categories=None):
+    """ Products of the given vendors and/or category subtrees. """
+    queryset = Product.objects.all()
+    if vendors is not None:
+        queryset = queryset.filter(vendor__in=vendors)
+    if categories is not None:
+        queryset = queryset.filter(
+            category_id__in = get_subtree_ids(categories),
+        )
+    return queryset
+
+
+def get_new_price(percent=None, amount=None, rounding='cents'):
+    """
+    The repriced value of F('price') as a database expression. The
+    ninety_nine rounding takes the nearest price ending in .99 at or
+    below the result (10.00 -> 9.99, 10.99 -> 10.99, 10.50 -> 9.99), so
+    it never raises a price; results under 0.99 are only rounded to cents.
+    """
+    decimal_field = models.DecimalField(max_digits=10, decimal_places=2)
+
+    price = F('price')
+    if percent is not None:
+        price = price * Value(
+            1 + Decimal(percent) / 100,
+            output_field = decimal_field,
+        )
+    if amount is not None:
+        price = price + Value(Decimal(amount), output_field=decimal_field)
+
+    if rounding == 'whole':
+        price = Round(price)
+    elif rounding == 'ninety_nine':
+        price = Case(
+            When(
+                LessThan(price, Value(Decimal('0.99'))),
+                then = Round(price, 2),
+            ),
+            default = Floor(price + Value(Decimal('0.01')))
+            - Value(Decimal('0.01')),
+            output_field = decimal_field,
+        )
+    else:
+        price = Round(price, 2)
+
+    return Greatest(
+        price,
+        Value(Decimal('0.00')),
+        output_field = decimal_field,
+    )
+
+
+def reprice(queryset, percent=None, amount=None, rounding='cents', dry_run=False):
+    """
+    Apply a percentage and/or absolute change to every product of the
+    queryset with one UPDATE, then refresh their price ranges with another.
+    Returns the number of products affected.
+    """
+    if percent is None and amount is None:
+        raise ValueError('Give a percent or an amount')
+    if rounding not in ROUNDING:
+        raise ValueError(f'Unknown rounding: {rounding}')
+
+    queryset = queryset.order_by()
+    if dry_run:
+        return queryset.count()
+
+    keys = set()
+    for pk, vendor_id, category_id in queryset.values_list(
+        'pk', 'vendor_id', 'category_id',
+    ):
+        keys.add(f'product:{pk}')
+        keys.add(f'vendor:{vendor_id}')
+        if category_id:
+            keys.add(f'category:{category_id}')
+
+    with transaction.atomic():
+        count = queryset.update(
+            price = get_new_price(percent, amount, rounding),
+            updated_at = timezone.now(),
+        )
+        queryset.refresh_price_range()
+    # update() sends no signals; purge the cached pages of what changed.
+    purge(*keys)
+    return count
@@ -0,0 +1,116 @@
+
+import hashlib, re, time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+PERIODS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 60 * 60 * 24,
+}
+
+RATE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+
+
+def parse_rate(rate):
+    """ '5/m' -> (5, 60); '10/30s' -> (10, 30). """
+    match = RATE.match(rate)
+    if not match:
+        raise ValueError(f'Invalid rate: {rate}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def get_cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def make_key(scope, value):
+    digest = hashlib.md5(str(value).lower().encode()).hexdigest()
+    return f'rl:{scope}:{digest}'
+
+
+def sliding_window(cache, key, limit, period, now=None):
+    """
+    Approximate sliding window from two fixed windows: the previous
+    window's count is weighted by how much of it still overlaps. Three
+    cache calls: add (to start the window), an atomic incr and a get of
+    the previous window. Returns (allowed, retry_after).
+    """
+    now = now or time.time()
+    window = int(now // period)
+    current_key = f'{key}:{window}'
+    previous_key = f'{key}:{window - 1}'
+
+    cache.add(current_key, 0, period * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.add(current_key, 1, period * 2)
+        current = 1
+    previous = cache.get(previous_key, 0)
+
+    overlap = 1 - (now - window * period) / period
+    if previous * overlap + current <= limit:
+        return True, 0
+    return False, max(1, int((window + 1) * period - now))
+
+
+def token_bucket(cache, key, limit, period, now=None):
+    """
+    Token bucket of `limit` tokens refilled over `period`, kept as a
+    theoretical arrival time (GCRA) in milliseconds and advanced with an
+    atomic incr; a refused request gives its token back. Returns
+    (allowed, retry_after).
+    """
+    now = int((now or time.time()) * 1000)
+    interval = period * 1000 // limit
+    burst = period * 1000
+
+    if cache.add(key, now + interval, period):
+        return True, 0
+    try:
+        arrival = cache.incr(key, interval)
+    except ValueError:
+        cache.add(key, now + interval, period)
+        return True, 0
+
+    if arrival - interval < now:
+        # The bucket had refilled completely; restart from now.
+        cache.set(key, now + interval, period)
+        return True, 0
+    if arrival - now <= burst:
+        cache.touch(key, period)
+        return True, 0
+
+    cache.decr(key, interval)
+    return False, max(1, (arrival - burst - now) // 1000 + 1)
+
+
+ALGORITHMS = {
+    'sliding_window': sliding_window,
+    'token_bucket': token_bucket,
+}
+
+
+def hit(scope, value, rate, algorithm='sliding_window'):
+    """ Count one request for value under scope; (allowed, retry_after). """
+    limit, period = parse_rate(rate)
+    return ALGORITHMS[algorithm](
+        get_cache(), make_key(scope, value), limit, period,
+    )
+
+
+def get_ip(request):
+    """
+    The client address; RATELIMIT_IP_HEADER (e.g. 'X-Forwarded-For')
+    is only trusted when set, behind a proxy that overwrites it.
+    """
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header and request.headers.get(header):
+        return request.headers[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
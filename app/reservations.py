@@ -0,0 +1,155 @@
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import *
+
+
+class OutOfStock(ValidationError):
+    pass
+
+
+def get_ttl():
+    return timedelta(
+        minutes = getattr(settings, 'STOCK_RESERVATION_MINUTES', 15),
+    )
+
+
+def decrement_stock(lines, held=None):
+    """
+    Take stock for lines of {'product_id', 'quantity'} with one
+    conditional UPDATE per product, counting quantities already held by
+    reservations. Products are updated in id order so concurrent
+    checkouts lock rows consistently.
+    """
+    quantities = defaultdict(int)
+    for line in lines:
+        quantities[line['product_id']] += line['quantity']
+    for product_id, quantity in (held or {}).items():
+        quantities[product_id] -= quantity
+
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        if quantity <= 0:
+            continue
+        updated = Product.objects.filter(
+            pk = product_id,
+            is_active = True,
+            stock__gte = quantity,
+        ).update(
+            stock = F('stock') - quantity,
+            updated_at = now,
+        )
+        if not updated:
+            raise OutOfStock(
+                _('NOT ENOUGH STOCK FOR PRODUCT %(product)s'),
+                code = 'out_of_stock',
+                params = {'product': product_id},
+            )
+
+    # Held units no longer needed go back on sale.
+    restock({
+        product_id: -quantity
+        for product_id, quantity in quantities.items()
+        if quantity < 0
+    })
+
+
+def restock(quantities):
+    """ Return {product_id: quantity} to stock, one UPDATE per product. """
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        if quantities[product_id] > 0:
+            Product.objects.filter(pk=product_id).update(
+                stock = F('stock') + quantities[product_id],
+                updated_at = now,
+            )
+
+
+def take(reservations):
+    """
+    Delete the reservations and return the quantities they held per
+    product, without touching stock.
+    """
+    rows = list(
+        reservations.select_for_update().values_list(
+            'pk', 'product_id', 'quantity',
+        )
+    )
+    quantities = defaultdict(int)
+    for _pk, product_id, quantity in rows:
+        quantities[product_id] += quantity
+    StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return quantities
+
+
+@transaction.atomic
+def release(reservations):
+    """ Drop reservations and put their stock back. """
+    quantities = take(reservations)
+    restock(quantities)
+    return sum(quantities.values())
+
+
+@transaction.atomic
+def reserve_cart(cart, ttl=None):
+    """
+    Hold stock for every line of the cart until now + ttl, replacing any
+    earlier hold of the same cart. Raises OutOfStock without holding
+    anything when a product cannot cover its quantity.
+    """
+    held = take(StockReservation.objects.filter(cart=cart))
+
+    lines = list(
+        CartItem.objects.filter(
+            cart = cart,
+        ).values(
+            'product_id',
+        ).annotate(
+            quantity = Sum('quantity'),
+        ).order_by()
+    )
+
+    decrement_stock(lines, held)
+
+    expires_at = timezone.now() + (ttl or get_ttl())
+    return StockReservation.objects.bulk_create([
+        StockReservation(
+            product_id = line['product_id'],
+            cart = cart,
+            quantity = line['quantity'],
+            expires_at = expires_at,
+        )
+        for line in lines
+    ])
+
+
+def release_expired(batch_size=1000, now=None):
+    """
+    Release expired reservations in batches, each in its own short
+    transaction. Rows locked by a checkout in progress are skipped.
+    """
+    now = now or timezone.now()
+    released = 0
+
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.filter(expires_at__lte=now)
+            if connection.features.has_select_for_update_skip_locked:
+                expired = expired.select_for_update(skip_locked=True)
+            batch = list(
+                expired.order_by('expires_at').values_list('pk', flat=True)[
+                    :batch_size
+                ]
+            )
+            if not batch:
+                return released
+            released += release(StockReservation.objects.filter(pk__in=batch))
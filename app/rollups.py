@@ -0,0 +1,124 @@
+
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+from .models import *
+
+
+def is_counted(is_paid, status):
+    """ Orders count towards sales once paid, until cancelled. """
+    return bool(is_paid) and status != 'CANCELLED'
+
+
+def get_totals(order_items, by_product):
+    """ Revenue, units and orders per vendor/day (or product/day). """
+    fields = ['vendor_id', 'day']
+    if by_product:
+        fields.append('product_id')
+
+    return order_items.annotate(
+        vendor_id = F('order__vendor_id'),
+        day = TruncDate('order__created_at'),
+    ).values(
+        *fields,
+    ).annotate(
+        total_revenue = Coalesce(
+            Sum(F('price') * F('quantity')),
+            Value(Decimal('0.00')),
+            output_field = models.DecimalField(
+                max_digits = 14,
+                decimal_places = 2,
+            ),
+        ),
+        total_units = Sum('quantity'),
+        total_orders = Count('order_id', distinct=True),
+    ).order_by()
+
+
+def add_totals(model, key_field, totals, sign, attempts=3):
+    """
+    Add sign * totals onto the rollup rows, creating missing ones. Locks
+    cannot cover rows that do not exist yet, so a concurrent transaction
+    may insert the same (key, date) first; those totals are then retried
+    as updates of its row.
+    """
+    totals = list(totals)
+
+    for attempt in range(attempts):
+        if not totals:
+            return
+
+        existing = {
+            (getattr(row, key_field), row.date): row
+            for row in model.objects.select_for_update().filter(**{
+                f'{key_field}__in': {total[key_field] for total in totals},
+                'date__in': {total['day'] for total in totals},
+            })
+        }
+
+        to_update = []
+        to_create = []
+        missing = []
+        for total in totals:
+            row = existing.get((total[key_field], total['day']))
+            if row is None:
+                row = model(**{
+                    'vendor_id': total['vendor_id'],
+                    'date': total['day'],
+                    key_field: total[key_field],
+                })
+                to_create.append(row)
+                missing.append(total)
+            else:
+                to_update.append(row)
+            row.revenue += sign * total['total_revenue']
+            row.units += sign * total['total_units']
+            row.orders += sign * total['total_orders']
+
+        model.objects.bulk_update(to_update, ['revenue', 'units', 'orders'])
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(to_create)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+            totals = missing
+        else:
+            return
+
+
+@transaction.atomic
+def apply_orders(order_ids, sign=1):
+    """ Add (sign=1) or remove (sign=-1) the orders from the rollups. """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    order_items = OrderItem.objects.filter(order_id__in=order_ids)
+    add_totals(
+        VendorDailySales, 'vendor_id', get_totals(order_items, False), sign,
+    )
+    add_totals(
+        ProductDailySales, 'product_id', get_totals(order_items, True), sign,
+    )
+
+
+@transaction.atomic
+def rebuild(start, end):
+    """
+    Recompute the rollups for dates start..end (inclusive) from the
+    orders. Safe to run repeatedly.
+    """
+    VendorDailySales.objects.filter(date__range=(start, end)).delete()
+    ProductDailySales.objects.filter(date__range=(start, end)).delete()
+
+    order_items = OrderItem.objects.filter(
+        order__is_paid = True,
+        order__created_at__date__range = (start, end),
+    ).exclude(
+        order__status = 'CANCELLED',
+    )
+    add_totals(VendorDailySales, 'vendor_id', get_totals(order_items, False), 1)
+    add_totals(ProductDailySales, 'product_id', get_totals(order_items, True), 1)
@@ -0,0 +1,59 @@
+
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q
+
+
+# Letters that do not decompose into a base letter plus accents.
+FOLD = str.maketrans({
+    'đ': 'd',
+    'ð': 'd',
+    'ø': 'o',
+    'ł': 'l',
+    'ß': 'ss',
+    'æ': 'ae',
+    'œ': 'oe',
+})
+
+
+def normalize_search(value, max_length=None):
+    """
+    Lowercased, accent-folded form stored in the search_* columns, cut to
+    max_length: casefold and NFKD can lengthen text ('ß' -> 'ss').
+    """
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value).casefold())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    value = ' '.join(value.translate(FOLD).split())
+    return value[:max_length].rstrip() if max_length else value
+
+
+def prefix_q(field, prefix, using='default'):
+    """
+    Prefix match on a normalized column that its b-tree index can serve:
+    LIKE 'x%' on PostgreSQL (varchar_pattern_ops index), a range
+    elsewhere, since SQLite's case-insensitive LIKE skips plain indexes.
+    """
+    if connections[using].vendor == 'postgresql':
+        return Q(**{f'{field}__startswith': prefix})
+    return Q(**{
+        f'{field}__gte': prefix,
+        f'{field}__lt': prefix + '\U0010ffff',
+    })
+
+
+def search(queryset, fields, term):
+    """ Rows where the normalized term prefixes one of the fields. """
+    term = normalize_search(term)
+    if not term:
+        return queryset
+    condition = Q()
+    for field in fields:
+        # Stored values are cut to the column, so cut the term the same way.
+        max_length = queryset.model._meta.get_field(field).max_length
+        condition |= prefix_q(
+            field, normalize_search(term, max_length), queryset.db,
+        )
+    return queryset.filter(condition)
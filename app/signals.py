@@ -6,7 +6,15 @@ from django.contrib.auth.signals import (
     user_login_failed,
     user_logged_out,
 )
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
+from django.conf import settings
+
+from .cart import SessionCart
+from .models import Order, Product, ProductImage, ProductVariant, User
+from .pagecache import get_surrogate_keys, purge
+from .rollups import apply_orders, is_counted
+from .tasks import make_thumbnails
 
 
 logger = logging.getLogger('app')
@@ -15,6 +23,11 @@ logger = logging.getLogger('app')
 def post_login(sender, request, user, **kwargs):
     logger.info(f'User: {user.username} logged in')
 
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        SessionCart(request).flush(user)
+
 @receiver(user_logged_out)
 def post_logout(sender, request, user, **kwargs):
     logger.info(f'User: {user.username} logged out')
@@ -22,3 +35,46 @@ def post_logout(sender, request, user, **kwargs):
 @receiver(user_login_failed)
 def post_login_fail(sender, credentials, request, **kwargs):
     logger.info(f'Login failed with credentials: {credentials}')
+
+@receiver(post_save, sender=Product)
+def product_price_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    Product.objects.filter(pk=instance.pk).refresh_price_range()
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def product_variant_changed(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).refresh_price_range()
+
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Before the cascade removes the items the rollups are computed from;
+    # the stored flags, since the instance may be stale.
+    row = Order.objects.filter(pk=instance.pk).values_list(
+        'is_paid', 'status',
+    ).first()
+    if row and is_counted(*row):
+        apply_orders([instance.pk], -1)
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'file' not in update_fields:
+        return
+    if instance.file:
+        make_thumbnails.delay(instance.file.name)
+
+@receiver(post_save, sender=User)
+def user_avatar_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    if instance.avatar:
+        make_thumbnails.delay(instance.avatar.name)
+
+@receiver(post_save)
+@receiver(post_delete)
+def purge_cached_pages(sender, instance, raw=False, **kwargs):
+    if raw or sender._meta.app_label != 'app':
+        return
+    if sender._meta.model_name in getattr(settings, 'PAGE_CACHE_RELATIONS', {}):
+        purge(*get_surrogate_keys(instance))
@@ -0,0 +1,97 @@
+
+import hashlib, os, re
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+HASH_LENGTH = 12
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+
+
+def is_hashed_name(name):
+    """ True for names written by HashedFileSystemStorage (immutable). """
+    return bool(HASHED_NAME.search(name))
+
+
+def strip_hash(name):
+    """ 'a.2d711642b726.jpg' -> 'a.jpg'; other names are returned as is. """
+    match = HASHED_NAME.search(name)
+    if not match:
+        return name
+    return name[:match.start()] + os.path.splitext(name)[1]
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Store uploads as <name>.<content hash>.<ext>. A given name always holds
+    the same bytes, so it can be cached forever; identical uploads share
+    one file.
+    """
+
+    def _save(self, name, content):
+        """
+        Write the content under its hashed name with an exclusive create.
+        FileSystemStorage._save would answer a collision by asking
+        get_available_name() for another name; here an existing file
+        already holds these bytes, so the hashed name is returned as is.
+        """
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            return name
+
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                file_move_safe(
+                    content.temporary_file_path(),
+                    full_path,
+                    allow_overwrite = False,
+                )
+            else:
+                fd = os.open(
+                    full_path,
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                    | getattr(os, 'O_BINARY', 0),
+                    0o666,
+                )
+                with os.fdopen(fd, 'wb') as file:
+                    for chunk in content.chunks():
+                        file.write(
+                            chunk if isinstance(chunk, bytes)
+                            else chunk.encode()
+                        )
+        except FileExistsError:
+            # Lost a race against an identical upload; its file is ours.
+            return name
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        """
+        Hashed names are content addressed, so never add a suffix; a hash
+        already in the name is dropped and recomputed from the content.
+        """
+        name = strip_hash(name)
+        if max_length:
+            root, ext = os.path.splitext(name)
+            excess = len(name) + HASH_LENGTH + 1 - max_length
+            if excess > 0:
+                name = root[:-excess] + ext
+        return name
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        root, ext = os.path.splitext(strip_hash(name))
+        return '{}.{}{}'.format(root, digest.hexdigest()[:HASH_LENGTH], ext)
@@ -0,0 +1,80 @@
+
+import requests
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Min
+
+from .jobs import enqueue_job, job
+from .models import *
+from .thumbnails import generate_thumbnails
+from . import uploads
+
+
+@job(priority=10)
+def recalculate_order(order_id):
+    """ Refresh item prices and the total of an order. """
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    for item in order.orderitem_set.select_related(
+        'product', 'product_variant',
+    ):
+        item.calculate_price()
+    order.calculate_total_price()
+
+
+@job(priority=5)
+def recalculate_payment(payment_id):
+    """ Refresh a payment amount, recomputing its order total first. """
+    payment = Payment.objects.filter(pk=payment_id).first()
+    if payment is None:
+        return
+    recalculate_order(payment.order_id)
+    payment.refresh_from_db()
+    payment.calculate_payment_amount()
+
+
+@job()
+def send_emails(batch_size=100):
+    """
+    Drain the email outbox, then queue another run for when the earliest
+    pending message (a failed send waiting out its backoff) is due.
+    """
+    from .outbox import send_pending
+
+    while sum(send_pending(batch_size)) >= batch_size:
+        pass
+
+    next_attempt_at = OutgoingEmail.objects.filter(
+        status = 'PENDING',
+    ).aggregate(
+        Min('next_attempt_at'),
+    )['next_attempt_at__min']
+    if next_attempt_at:
+        enqueue_job('send_emails', run_at=next_attempt_at, unique=True)
+
+
+@job(max_attempts=3)
+def download_file(model, pk, field, url, name):
+    """ Fetch url into a file field of the given 'app.Model' row. """
+    obj = apps.get_model(model).objects.filter(pk=pk).first()
+    if obj is None:
+        return
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    getattr(obj, field).save(name, ContentFile(response.content), save=True)
+
+
+@job(max_attempts=3)
+def process_avatar(user_id, name):
+    """ Normalise a staged avatar upload onto the user. """
+    uploads.process_avatar(user_id, name)
+
+
+@job(max_attempts=3)
+def make_thumbnails(name):
+    """ Render the configured thumbnail sizes of a stored image. """
+    if default_storage.exists(name):
+        generate_thumbnails(name)
@@ -0,0 +1,44 @@
+
+from django import template
+from django.templatetags.cache import CacheNode
+from django.utils import translation
+
+
+register = template.Library()
+
+
+class CurrentLanguage:
+    """ Stands in for a vary_on variable holding the active language. """
+
+    def resolve(self, context):
+        return translation.get_language()
+
+
+@register.tag('langcache')
+def do_langcache(parser, token):
+    """
+    Like {% cache %}, but always varies on the active language:
+
+        {% langcache 600 'account_chrome' user.is_authenticated %}
+            ...
+        {% endlangcache %}
+
+    Only pass user-agnostic values as vary_on; invalidate with
+    app.fragments.invalidate_fragment().
+    """
+    nodelist = parser.parse(('endlangcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return CacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2].strip('\'"'),
+        [CurrentLanguage()] + [
+            parser.compile_filter(token) for token in tokens[3:]
+        ],
+        None,
+    )
@@ -0,0 +1,102 @@
+
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps
+
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+def get_config():
+    return {
+        'sizes': getattr(settings, 'THUMBNAIL_SIZES', (50, 200, 800)),
+        'format': getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP').upper(),
+        'quality': getattr(settings, 'THUMBNAIL_QUALITY', 80),
+        'folder': getattr(settings, 'THUMBNAIL_FOLDER', 'thumbnails'),
+    }
+
+
+def thumbnail_name(name, size, config=None):
+    """ Storage name of the derivative: thumbnails/<size>/<name>.<ext> """
+    config = config or get_config()
+    root, _ = os.path.splitext(name)
+    return '{}/{}/{}.{}'.format(
+        config['folder'],
+        size,
+        root,
+        EXTENSIONS.get(config['format'], 'jpg'),
+    )
+
+
+def delete_thumbnails(name, config=None):
+    """ Remove every generated size of a stored image. """
+    config = config or get_config()
+    for size in config['sizes']:
+        default_storage.delete(thumbnail_name(name, size, config))
+
+
+def thumbnail_url(fieldfile, size):
+    """ URL of the derivative if generated, else of the original upload. """
+    if not fieldfile:
+        return None
+    name = thumbnail_name(fieldfile.name, size)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    return fieldfile.url
+
+
+def render_thumbnails(source, targets, image_format, quality, force=False):
+    """
+    Write one derivative per (size, path) in targets from the source path.
+    Plain paths only, so it can run inside a process pool.
+    """
+    source_mtime = os.path.getmtime(source)
+    pending = [
+        (size, path) for size, path in targets
+        if force
+        or not os.path.exists(path)
+        or os.path.getmtime(path) < source_mtime
+    ]
+    if not pending:
+        return 0
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        # Largest first so each step downsamples the previous result.
+        for size, path in sorted(pending, reverse=True):
+            image.thumbnail((size, size), Image.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.save(path, image_format, quality=quality)
+
+    return len(pending)
+
+
+def get_targets(name, config=None):
+    config = config or get_config()
+    return [
+        (size, default_storage.path(thumbnail_name(name, size, config)))
+        for size in config['sizes']
+    ]
+
+
+def generate_thumbnails(name, force=False):
+    """ Generate all configured sizes for a stored image. """
+    config = get_config()
+    return render_thumbnails(
+        default_storage.path(name),
+        get_targets(name, config),
+        config['format'],
+        config['quality'],
+        force,
+    )
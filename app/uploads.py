@@ -0,0 +1,90 @@
+
+import io, os, uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    SkipFile,
+    TemporaryFileUploadHandler,
+)
+
+from PIL import Image, ImageOps
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream every upload to a temp file and drop it once it grows past
+    MAX_UPLOAD_SIZE (or the UPLOAD_SIZE_LIMITS entry for the request path
+    prefix). Dropped fields are listed in request.rejected_uploads.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.received = 0
+        self.max_size = self.get_max_size()
+        super().new_file(field_name, *args, **kwargs)
+
+    def get_max_size(self):
+        path = getattr(self.request, 'path', '')
+        for prefix, size in getattr(settings, 'UPLOAD_SIZE_LIMITS', {}).items():
+            if path.startswith(prefix):
+                return size
+        return getattr(settings, 'MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            rejected = getattr(self.request, 'rejected_uploads', [])
+            rejected.append(self.field_name)
+            self.request.rejected_uploads = rejected
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def stage_upload(upload, folder):
+    """ Move the temp upload into storage untouched (a rename on disk). """
+    _, ext = os.path.splitext(upload.name)
+    return default_storage.save(
+        f'{folder}/pending/{uuid.uuid4().hex}{ext.lower()}',
+        upload,
+    )
+
+
+def process_avatar(user_id, name):
+    """
+    Decode, strip metadata and downscale a staged avatar, then delete the
+    avatar it replaces. Safe to retry: a missing staged file is a no-op.
+    """
+    from .models import User
+    from .thumbnails import delete_thumbnails
+
+    if not default_storage.exists(name):
+        return
+
+    max_size = getattr(settings, 'AVATAR_MAX_DIMENSION', 512)
+
+    with default_storage.open(name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Saving without exif/icc drops all metadata from the original.
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=85, optimize=True)
+
+    user = User.objects.filter(pk=user_id).first()
+    if user:
+        previous = user.avatar.name
+        user.avatar.save(
+            f'{uuid.uuid4().hex}.jpg',
+            ContentFile(output.getvalue()),
+            save = False,
+        )
+        user.save(update_fields=['avatar', 'updated_at'])
+        if previous and previous != user.avatar.name:
+            default_storage.delete(previous)
+            delete_thumbnails(previous)
+
+    default_storage.delete(name)
@@ -1,13 +1,18 @@
 
+from datetime import timedelta
+
 from django.shortcuts import (
     render,
     redirect,
     HttpResponse,
 )
+from django.core.exceptions import ValidationError
 from django.core.serializers import serialize
+from django.db.models import Sum
 from django.http import (
     JsonResponse,
 )
+from django.views.decorators.http import require_POST
 from django.urls import reverse
 from django.contrib.auth import (
     login as django_login,
@@ -23,15 +28,22 @@ from django.contrib.auth.forms import (
 )
 from django.contrib import messages
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .cart import SessionCart
+from .checkout import checkout_all, reserve_all
+from .conditional import condition_on_updated_at
 from .forms import *
 from .models import *
+from .outbox import enqueue_email
+from .pagecache import page_cache
 from .permissions import *
+from .reservations import OutOfStock
 
 
 User = get_user_model()
@@ -41,6 +53,9 @@ def index(request):
     return HttpResponse('')
 
 
+@page_cache()
+@rate_limit('30/m', key='ip')
+@rate_limit('5/m', key='username', algorithm='token_bucket')
 def login(request):
 
     if request.user.is_authenticated:
@@ -82,6 +97,8 @@ def logout(request):
     return redirect(next_url)
 
 
+@page_cache()
+@rate_limit('10/h', key='ip')
 def register(request):
 
     if request.method == 'POST':
@@ -106,6 +123,7 @@ def register(request):
 
 
 @login_required
+@condition_on_updated_at(lambda request: [request.user])
 def profile(request):
 
     if request.method == 'POST':
@@ -114,13 +132,16 @@ def profile(request):
             request.POST,
             request.FILES,
             instance=request.user,
+            rejected_uploads=getattr(request, 'rejected_uploads', ()),
         )
 
         if form.is_valid():
             form.save()
             messages.success(request, _('UPDATED SUCCESSFULLY'))
             return redirect('profile')
-        
+
+        messages.error(request, form.errors)
+
     form = ProfileForm(instance=request.user)
 
     return render(request, 'account/profile.html', {
@@ -153,6 +174,9 @@ def change_password(request):
     })
 
 
+@page_cache()
+@rate_limit('10/h', key='ip')
+@rate_limit('3/h', key='email', algorithm='token_bucket')
 def forget_password(request):
 
     if request.method == 'POST':
@@ -194,11 +218,11 @@ def forget_password(request):
                     context,
                 )
 
-                send_mail(
+                enqueue_email(
                     subject,
                     email_content,
+                    [user.email],
                     'noreply@yoursite.com',
-                    [user.email]
                 )
                 
                 messages.success(request, 'Password reset email has been sent!')
@@ -238,9 +262,128 @@ def reset_password(request, uidb64, token):
 
 @login_required
 @own_order_required
+@condition_on_updated_at(
+    lambda request, order_id: [request.owned_objects['order_id']],
+)
 def api_order_detail(request, order_id):
-    orders = Order.objects.filter(
-        user = request.user,
-        id = order_id,
-    )
-    return HttpResponse(serialize('json', orders))
+    order = request.owned_objects['order_id']
+    return HttpResponse(serialize('json', [order]))
+
+
+def api_cart(request):
+
+    cart = SessionCart(request)
+
+    if request.method == 'POST':
+        try:
+            cart.add(
+                request.POST['product_id'],
+                request.POST.get('variant_id'),
+                request.POST.get('quantity', 1),
+            )
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Invalid cart item.'}, status=400)
+
+    return JsonResponse({
+        'items': [
+            {
+                'product_id': product_id,
+                'variant_id': variant_id,
+                'quantity': quantity,
+            }
+            for product_id, variant_id, quantity in cart
+        ],
+    })
+
+
+@require_POST
+@login_required
+def api_reserve(request):
+
+    SessionCart(request).flush(request.user)
+
+    try:
+        reservations = reserve_all(request.user)
+    except OutOfStock as ex:
+        return JsonResponse({'error': ex.messages}, status=409)
+    except ValidationError as ex:
+        return JsonResponse({'error': ex.messages}, status=400)
+
+    return JsonResponse({
+        'reservations': [
+            {
+                'product_id': reservation.product_id,
+                'quantity': reservation.quantity,
+            }
+            for reservation in reservations
+        ],
+        'expires_at': reservations[0].expires_at,
+    })
+
+
+@require_POST
+@login_required
+def api_checkout(request):
+
+    try:
+        payment_method = PaymentMethod.objects.filter(
+            pk = int(request.POST.get('payment_method_id', '')),
+        ).first()
+    except ValueError:
+        payment_method = None
+    if payment_method is None:
+        return JsonResponse({'error': 'Invalid payment method.'}, status=400)
+
+    SessionCart(request).flush(request.user)
+
+    try:
+        orders = checkout_all(request.user, payment_method)
+    except OutOfStock as ex:
+        return JsonResponse({'error': ex.messages}, status=409)
+    except ValidationError as ex:
+        return JsonResponse({'error': ex.messages}, status=400)
+
+    return JsonResponse({
+        'orders': [
+            {
+                'id': order.pk,
+                'vendor_id': order.vendor_id,
+                'total_price': str(order.total_price),
+            }
+            for order in orders
+        ],
+    })
+
+
+@login_required
+@multi_ownership_required({'vendor_id': (Vendor, 'user')})
+def api_vendor_sales(request, vendor_id):
+    """ Daily and per-product sales of a vendor, read from the rollups. """
+
+    try:
+        end = parse_date(request.GET.get('end', '')) or timezone.localdate()
+        start = parse_date(request.GET.get('start', '')) \
+            or end - timedelta(days=29)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date.'}, status=400)
+
+    daily = VendorDailySales.objects.filter(
+        vendor_id = vendor_id,
+        date__range = (start, end),
+    ).order_by('date').values('date', 'revenue', 'units', 'orders')
+
+    products = ProductDailySales.objects.filter(
+        vendor_id = vendor_id,
+        date__range = (start, end),
+    ).values('product_id').annotate(
+        revenue = Sum('revenue'),
+        units = Sum('units'),
+        orders = Sum('orders'),
+    ).order_by('-revenue')
+
+    return JsonResponse({
+        'start': start,
+        'end': end,
+        'daily': list(daily),
+        'products': list(products),
+    })
@@ -23,6 +23,43 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'staticfiles')]
 
+# Uploads are stored under content-hashed names, served by app.media with
+# ETags/Range support. Set MEDIA_SENDFILE to 'X-Sendfile' or
+# 'X-Accel-Redirect' to hand the body off to the front-end server.
+STORAGES = {
+    'default': {
+        'BACKEND': 'app.storage.HashedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'app.compression.CompressedStaticFilesStorage',
+    },
+}
+MEDIA_CACHE_MAX_AGE = 3600
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Responses (app.middleware.CompressionMiddleware) and collectstatic
+# .gz/.br siblings below this size are left uncompressed. Brotli is used
+# when the optional `brotli` package is installed, but never for HTML
+# responses, which get gzip with GZipMiddleware's BREACH mitigation.
+COMPRESS_MIN_SIZE = 200
+BROTLI_QUALITY = 5
+
+# Derivatives written under MEDIA_ROOT/THUMBNAIL_FOLDER/<size>/
+THUMBNAIL_SIZES = (50, 200, 800)
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_FOLDER = 'thumbnails'
+
+# Uploads stream to a temp file and are dropped past MAX_UPLOAD_SIZE bytes.
+FILE_UPLOAD_HANDLERS = ['app.uploads.LimitedUploadHandler']
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+UPLOAD_SIZE_LIMITS = {
+    '/admin/app/vendor/': 200 * 1024 * 1024,
+}
+AVATAR_MAX_PIXELS = 25_000_000
+AVATAR_MAX_DIMENSION = 512
+
 #-------------------------------------------------
 # Timezone
 #-------------------------------------------------
@@ -65,6 +102,10 @@ INSTALLED_APPS = [
 #-------------------------------------------------
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+
+    # gzip/brotli; sees the body after every middleware below.
+    'app.middleware.CompressionMiddleware',
+
     'django.contrib.sessions.middleware.SessionMiddleware',
 
     # Multiple languages
@@ -78,6 +119,9 @@ MIDDLEWARE = [
 
     # Fix: Cannot query 'None(User)': Must be 'Group' instance.
     'app.middleware.BlockNormalUserMiddleware',
+
+    # Anonymous full-page cache for @page_cache views; keep last.
+    'app.middleware.PageCacheMiddleware',
 ]
 
 #-------------------------------------------------
@@ -101,6 +145,12 @@ TEMPLATES = [
     },
 ]
 
+# Templates compiled at startup into Django's cached loader (globs under
+# DIRS).
+TEMPLATE_PRECOMPILE = [
+    'account/*.html',
+]
+
 #-------------------------------------------------
 # Databases
 #-------------------------------------------------
@@ -108,9 +158,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock at BEGIN so concurrent checkouts queue up
+        # instead of failing on lock upgrade.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+#-------------------------------------------------
+# Cache
+#-------------------------------------------------
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Full-page cache (app.pagecache). Saving or deleting a model purges the
+# pages tagged '<model>:<pk>' and '<relation>:<id>' for these relations.
+PAGE_CACHE_TIMEOUT = 600
+PAGE_CACHE_RELATIONS = {
+    'product': ['vendor', 'category'],
+    'productvariant': ['product'],
+    'productimage': ['product'],
+    'category': ['parent'],
+    'vendor': [],
+}
+
+#-------------------------------------------------
+# Cart
+#-------------------------------------------------
+# 'session' or 'cache'; lines reach Cart/CartItem at login and checkout.
+CART_STORAGE = 'session'
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CART_MAX_QUANTITY = 999
+STOCK_RESERVATION_MINUTES = 15
+
 #-------------------------------------------------
 # Authentication Settings
 #-------------------------------------------------
@@ -119,11 +204,41 @@ AUTH_USER_MODEL = 'app.User'
 # Process: Inactive Errors messagse when login
 AUTHENTICATION_BACKENDS = ['app.backends.AuthenticationBackend']
 
+# @rate_limit counters (app.ratelimit). Use a shared cache (memcached,
+# redis) when running several processes. Only set RATELIMIT_IP_HEADER
+# behind a proxy that overwrites it, e.g. 'X-Forwarded-For'.
+RATELIMIT_CACHE = 'default'
+RATELIMIT_IP_HEADER = None
+
 #-------------------------------------------------
 # Email
 #-------------------------------------------------
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = BASE_DIR / 'emails'
+DEFAULT_FROM_EMAIL = 'noreply@yoursite.com'
+
+# Outbox delivery (send_emails): retries back off from EMAIL_RETRY_SECONDS.
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_SECONDS = 60
+EMAIL_LEASE_SECONDS = 300
+
+#-------------------------------------------------
+# Admin
+#-------------------------------------------------
+# Large changelists (app.pagination.EstimatedCountPaginator) show the
+# database's row estimate above this size; exact counts are cached.
+ADMIN_EXACT_COUNT_THRESHOLD = 100_000
+ADMIN_COUNT_CACHE_SECONDS = 300
+
+#-------------------------------------------------
+# Jobs
+#-------------------------------------------------
+# Run with `python manage.py worker`; failed jobs back off from
+# JOB_RETRY_SECONDS and are dead-lettered after their max_attempts.
+# Workers renew the leases of their jobs every JOB_LEASE_SECONDS / 3; a
+# job is only reclaimed once its worker has stopped renewing it.
+JOB_RETRY_SECONDS = 10
+JOB_LEASE_SECONDS = 300
 
 #-------------------------------------------------
 # Logging
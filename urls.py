@@ -1,12 +1,14 @@
+import re
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from django.shortcuts import HttpResponse, render
 
 from app.views import *
+from app.media import serve_media, serve_static
+from app.pagecache import page_cache
 
 
 urlpatterns = [
@@ -16,7 +18,9 @@ urlpatterns = [
     path('403', lambda request: HttpResponse('403'), name='403'),
     path(
         'change_language/',
-        lambda request: render(request, 'change_language.html'),
+        page_cache()(
+            lambda request: render(request, 'change_language.html'),
+        ),
         name='change_language',
     ),
 
@@ -38,6 +42,14 @@ urlpatterns = [
         api_order_detail,
         name = 'api_order_detail'
     ),
+    path('api_cart/', api_cart, name='api_cart'),
+    path('api_reserve/', api_reserve, name='api_reserve'),
+    path('api_checkout/', api_checkout, name='api_checkout'),
+    path(
+        'api_vendor_sales/<int:vendor_id>/',
+        api_vendor_sales,
+        name = 'api_vendor_sales',
+    ),
 ]
 
 urlpatterns += i18n_patterns(
@@ -46,5 +58,15 @@ urlpatterns += i18n_patterns(
 )
 
 
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+urlpatterns += [
+    re_path(
+        r'^{}(?P<path>.*)$'.format(re.escape(settings.STATIC_URL.lstrip('/'))),
+        serve_static,
+        name = 'static',
+    ),
+    re_path(
+        r'^{}(?P<path>.*)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))),
+        serve_media,
+        name = 'media',
+    ),
+]
\ No newline at end of file